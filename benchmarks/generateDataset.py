@@ -0,0 +1,73 @@
+''' Script that generates a synthetic DataOrtho tree for the benchmarks
+    DATASET_AXIAL/SAGITTAL/DYNAMIC/<individual>/<LEFT|RIGHT>/<sequence>/*.dcm, the layout extract_components expects.
+    Slices are 16-bit MR images (12 bits stored) of random noise over a smooth gradient, uncompressed or RLE Lossless.
+        python -m benchmarks.generateDataset OUTPUT_DIR [--individuals N] [--slices N] [--rows N] [--columns N] [--compression none|rle]
+'''
+import os
+import argparse
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, RLELossless, MRImageStorage, generate_uid
+
+DATASETS = ['DATASET_AXIAL', 'DATASET_SAGITTAL', 'DATASET_DYNAMIC']
+KNEES = ['LEFT', 'RIGHT']
+
+def make_slice(pixel_array, instance_number, compression):
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = MRImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.is_little_endian = True
+    ds.is_implicit_VR = False
+    ds.SOPClassUID = MRImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = 'MR'
+    ds.InstanceNumber = instance_number
+    ds.Rows, ds.Columns = pixel_array.shape
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = 'MONOCHROME2'
+    ds.BitsAllocated = 16
+    ds.BitsStored = 12
+    ds.HighBit = 11
+    ds.PixelRepresentation = 0
+    ds.WindowCenter = 1000
+    ds.WindowWidth = 1500
+    ds.PixelData = pixel_array.astype(np.uint16).tobytes()
+    if compression == 'rle':
+        ds.compress(RLELossless, pixel_array.astype(np.uint16))
+    return ds
+
+# Writes one sequence directory, returns its path
+def make_sequence(sequence_path, slices, rows, columns, compression, rng):
+    os.makedirs(sequence_path, exist_ok=True)
+    gradient = np.add.outer(np.linspace(0, 2000, rows), np.linspace(0, 1000, columns))
+    for i in range(slices):
+        pixel_array = np.clip(gradient + rng.normal(0, 200, (rows, columns)) + 30 * i, 0, 4095)
+        make_slice(pixel_array, i + 1, compression).save_as(os.path.join(sequence_path, f'IM{i:04d}.dcm'), write_like_original=False)
+    return sequence_path
+
+def generate_dataset(output_dir, individuals=3, slices=20, rows=256, columns=256, compression='none', seed=0):
+    rng = np.random.default_rng(seed)
+    sequence_paths = []
+    for dataset in DATASETS:
+        for individual in range(1, individuals + 1):
+            for knee in KNEES:
+                sequence = f'seq_{dataset.split("_")[1].lower()}_{individual}'
+                sequence_path = os.path.join(output_dir, dataset, str(individual), knee, sequence)
+                sequence_paths.append(make_sequence(sequence_path, slices, rows, columns, compression, rng))
+    return sequence_paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generates a synthetic DICOM dataset in the DataOrtho layout.')
+    parser.add_argument('output_dir')
+    parser.add_argument('--individuals', type=int, default=3, help='individuals per subset (default: 3)')
+    parser.add_argument('--slices', type=int, default=20, help='slices per sequence (default: 20)')
+    parser.add_argument('--rows', type=int, default=256)
+    parser.add_argument('--columns', type=int, default=256)
+    parser.add_argument('--compression', choices=['none', 'rle'], default='none')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sequence_paths = generate_dataset(args.output_dir, args.individuals, args.slices, args.rows, args.columns, args.compression, args.seed)
+    print(f'|-> Generated {len(sequence_paths)} sequences of {args.slices} slices ({args.rows}x{args.columns}, {args.compression}) in {args.output_dir} |')
@@ -0,0 +1,223 @@
+''' Headless benchmark suite of LabelingGUI's hot paths, on a synthetic dataset (generateDataset.py) and offscreen VTK/Qt
+    Times DICOMImage.load_dicom, the first slice of a streamed load, update_image (with and without a render),
+    save_landmarks, clear_landmarks, tree building, tree status updates and status store updates.
+    The volume cache and the packed volume store are disabled so every load decodes the .dcm files.
+    Loads, saves and clears run on a copy of the first sequence's .dcm files in the work directory, the landmark json
+    files of the dataset (--dataset may be a real one) are never written.
+    Results (milliseconds per operation) are written as JSON, --compare prints the ratio to an earlier results file.
+        python -m benchmarks.runBenchmarks [--dataset DIR] [--individuals N] [--slices N] [--rows N] [--columns N]
+                                           [--compression none|rle] [--repeat N] [--output results.json] [--compare old.json]
+'''
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import statistics
+from datetime import datetime
+
+RESULTS_VERSION = 1
+
+def summarize(samples):
+    return {
+        "Runs": len(samples),
+        "Mean": statistics.mean(samples),
+        "Median": statistics.median(samples),
+        "Min": min(samples),
+        "Max": max(samples),
+        "Stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0
+    }
+
+# Runs func(state) repeat times. setup builds a fresh state before every run and teardown gets what func returned,
+# neither is timed. per divides each sample, for timings of a single step of a loop
+def measure(results, name, func, repeat, setup=None, teardown=None, per=1):
+    samples = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        returned = func(state)
+        samples.append((time.perf_counter() - start) * 1000 / per)
+        if teardown is not None:
+            teardown(returned)
+    results[name] = summarize(samples)
+    print(f'|-> {name}: median {results[name]["Median"]:.3f} ms, min {results[name]["Min"]:.3f} ms ({repeat} runs) |')
+
+# The application modules read their settings at import time, everything points into the work directory
+def configure_environment(base_dir, work_dir):
+    os.environ.update({
+        "BASE_DIR": base_dir,
+        "STATUS_FILE": os.path.join(work_dir, 'status.json'),
+        "STATUS_DB": os.path.join(work_dir, 'status.sqlite'),
+        "LANDMARK_DB": os.path.join(work_dir, 'landmarks.sqlite'),
+        "INDEX_FILE": os.path.join(work_dir, 'dataset_index.json'),
+        "SCAN_CACHE": os.path.join(work_dir, 'scan_cache.json'),
+        # no workbooks to import, the landmark store of the work directory starts empty
+        "DATASET_AXIAL": os.path.join(work_dir, 'no_workbooks', 'dataset_axial.xlsx'),
+        "DATASET_SAGITTAL": os.path.join(work_dir, 'no_workbooks', 'dataset_sagittal.xlsx'),
+        "DATASET_DYNAMIC": os.path.join(work_dir, 'no_workbooks', 'dataset_dynamic.xlsx'),
+        "VOLUME_CACHE_MB": '0',
+        "VOLUME_STORE": '0'
+    })
+    os.environ.setdefault("QT_QPA_PLATFORM", 'offscreen')
+
+# Copies the .dcm files of a sequence below work_dir, keeping the DATASET_*/individual/knee/sequence layout
+def copy_sequence(sequence_path, base_dir, work_dir):
+    copy_path = os.path.join(work_dir, 'sequence', os.path.relpath(sequence_path, base_dir))
+    os.makedirs(copy_path)
+    for file_name in os.listdir(sequence_path):
+        if file_name.endswith('.dcm'):
+            shutil.copy2(os.path.join(sequence_path, file_name), copy_path)
+    return copy_path
+
+def run_benchmarks(base_dir, work_dir, repeat):
+    import vtk
+    import pydicom
+    from PyQt5.QtWidgets import QApplication
+    from dicomProcessing import DICOMImage, max_landmarks
+    from datasetIndex import iter_sequence_dirs
+    from datasetTreeModel import DatasetTreeModel
+    from statusStore import StatusStore, StatusService
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    ren = vtk.vtkRenderer()
+    render_window = vtk.vtkRenderWindow()
+    render_window.SetOffScreenRendering(1)
+    render_window.SetSize(512, 512)
+    render_window.AddRenderer(ren)
+
+    sequences = list(iter_sequence_dirs(base_dir))
+    # save_landmarks/clear_landmarks write <sequence>.json next to the .dcm files, only ever in the copy
+    sequence_path = copy_sequence(sequences[0][4], base_dir, work_dir)
+    results = {}
+
+    def open_image(streaming):
+        ren.RemoveAllViewProps()
+        return DICOMImage(sequence_path, ren, streaming=streaming)
+
+    def close_image(image):
+        image.close()
+        ren.RemoveAllViewProps()
+
+    # constructor until the first slice is on screen, the rest streams in the background
+    measure(results, "open_streaming_first_slice", lambda _: open_image(True), repeat, teardown=close_image)
+    # decode of the whole sequence
+    image = open_image(False)
+    measure(results, "load_dicom", lambda _: image.load_dicom(), repeat)
+
+    slices = image.max_slice
+    def step_slices(render):
+        for index in range(slices):
+            image.index = index
+            image.update_image()
+            if render:
+                render_window.Render()
+    measure(results, "update_image", lambda _: step_slices(False), repeat, per=slices)
+    measure(results, "update_image_render", lambda _: step_slices(True), repeat, per=slices)
+
+    count = max_landmarks[image.dataset_type]
+    def mark_landmarks():
+        image.clear_landmarks()
+        image.status = 0
+        image.add_landmarks([[5.0 + k, 5.0 + k, k % slices] for k in range(count)])
+        return image
+    measure(results, "save_landmarks", lambda _: image.save_landmarks(), repeat, setup=mark_landmarks)
+    def saved_landmarks():
+        mark_landmarks()
+        image.save_landmarks()
+        return image
+    measure(results, "clear_landmarks", lambda _: image.clear_landmarks(), repeat, setup=saved_landmarks)
+    close_image(image)
+
+    # full tree of every subset, every node expanded and every status filled
+    store = StatusStore()
+    store.add_missing([path for _, _, _, _, path in sequences], 0)
+    status_service = StatusService(store)
+    model = DatasetTreeModel(status_service.get)
+    datasets = sorted({dataset for dataset, _, _, _, _ in sequences})
+    def build_tree(_):
+        for dataset in datasets:
+            model.listings.clear()
+            model.set_root(os.path.join(base_dir, dataset))
+            pending = [model.index(row, 0) for row in range(model.rowCount())]
+            while pending:
+                index = pending.pop()
+                if model.canFetchMore(index):
+                    model.fetchMore(index)
+                pending.extend(model.index(row, 0, index) for row in range(model.rowCount(index)))
+            while model.pending_status:
+                model.fill_status()
+    measure(results, "tree_build", build_tree, repeat)
+    tree_keys = list(model.sequence_indexes)
+    measure(results, "tree_status_update", lambda _: [model.set_status(*key, 1) for key in tree_keys], repeat, per=len(tree_keys))
+    status_paths = [path for _, _, _, _, path in sequences]
+    def update_statuses(_):
+        for i, path in enumerate(status_paths):
+            status_service.set(path, i % 2)
+    measure(results, "status_update", update_statuses, repeat, per=len(status_paths))
+    store.close()
+
+    environment = {
+        "Python": platform.python_version(),
+        "Platform": platform.platform(),
+        "Processor": platform.processor(),
+        "CPUs": os.cpu_count(),
+        "VTK": vtk.vtkVersion.GetVTKVersion(),
+        "pydicom": pydicom.__version__,
+        "DecodeWorkers": os.getenv('DECODE_WORKERS'),
+        "DecodeBackend": os.getenv('DECODE_BACKEND'),
+        "VoxelMode": os.getenv('VOXEL_MODE', 'uint8')
+    }
+    return environment, results
+
+# Prints current/previous medians of the benchmarks both files have
+def compare_results(results, previous_file):
+    with open(previous_file, 'r') as f:
+        previous = json.load(f)["Results"]
+    print(f'{"Benchmark":<30}{"Previous ms":>14}{"Current ms":>14}{"Ratio":>9}')
+    for name, result in results.items():
+        if name in previous:
+            before, after = previous[name]["Median"], result["Median"]
+            print(f'{name:<30}{before:>14.3f}{after:>14.3f}{(after / before if before else float("nan")):>9.2f}')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Runs the headless LabelingGUI benchmarks and writes the results as JSON.')
+    parser.add_argument('--dataset', default=None, help='existing dataset root (default: a generated one in a temporary directory)')
+    parser.add_argument('--individuals', type=int, default=3)
+    parser.add_argument('--slices', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=256)
+    parser.add_argument('--columns', type=int, default=256)
+    parser.add_argument('--compression', choices=['none', 'rle'], default='none')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help='earlier results file to compare with')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='labelinggui_bench_')
+    try:
+        dataset_info = {"Path": args.dataset}
+        base_dir = args.dataset
+        if base_dir is None:
+            from benchmarks.generateDataset import generate_dataset
+            base_dir = os.path.join(work_dir, 'DataOrtho')
+            generate_dataset(base_dir, args.individuals, args.slices, args.rows, args.columns, args.compression)
+            dataset_info = {"Individuals": args.individuals, "Slices": args.slices, "Rows": args.rows, "Columns": args.columns, "Compression": args.compression}
+        configure_environment(base_dir, work_dir)
+        environment, results = run_benchmarks(base_dir, work_dir, args.repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            "Version": RESULTS_VERSION,
+            "Date": datetime.now().isoformat(timespec='seconds'),
+            "Environment": environment,
+            "Dataset": dataset_info,
+            "Repeat": args.repeat,
+            "Results": results
+        }, f, indent=4)
+    print(f'|-> Benchmark results written to {args.output} |')
+    if args.compare:
+        compare_results(results, args.compare)
@@ -13,4 +13,43 @@ EXCEL_PATHS = {
     'DATASET_AXIAL': os.getenv('DATASET_AXIAL', '/default/path/dataset_axial.xlsx'),
     'DATASET_SAGITTAL': os.getenv('DATASET_SAGITTAL', '/default/path/dataset_sagittal.xlsx'),
     'DATASET_DYNAMIC': os.getenv('DATASET_DYNAMIC', '/default/path/dataset_dynamic.xlsx')
-}
\ No newline at end of file
+}
+
+# landmarks to mark on every sequence of a subset
+MAX_LANDMARKS = {'DATASET_AXIAL':11,'DATASET_SAGITTAL':7,'DATASET_DYNAMIC':18}
+
+# DICOM decoding, number of pool workers (1 decodes on the calling thread) and pool type: thread or process
+DECODE_WORKERS = int(os.getenv('DECODE_WORKERS', os.cpu_count() or 1))
+DECODE_BACKEND = os.getenv('DECODE_BACKEND', 'thread')
+
+# show the first slice as soon as it is decoded and stream the rest of the sequence in the background (1 or 0)
+STREAMING_LOAD = os.getenv('STREAMING_LOAD', '1') == '1'
+
+# memory budget of the in-memory cache of decoded sequence volumes, in MB (0 disables it)
+VOLUME_CACHE_MB = int(os.getenv('VOLUME_CACHE_MB', 1024))
+
+# persistent store of normalized volumes (1 or 0), kept in each sequence directory unless VOLUME_STORE_DIR is set
+VOLUME_STORE = os.getenv('VOLUME_STORE', '1') == '1'
+VOLUME_STORE_DIR = os.getenv('VOLUME_STORE_DIR', '')
+
+# header only index of the dataset, see datasetIndex.py
+INDEX_FILE = os.getenv('INDEX_FILE', os.path.join(BASE_DIR, 'dataset_index.json'))
+
+# voxels kept in memory: uint8 (normalized grayscale) or 16bit (raw modality values, full dynamic range)
+VOXEL_MODE = os.getenv('VOXEL_MODE', 'uint8')
+
+# SQLite status store, imported from STATUS_FILE the first time it is created
+STATUS_DB = os.getenv('STATUS_DB', os.path.splitext(STATUS_FILE)[0] + '.sqlite')
+
+# SQLite landmark store, the DATASET_*.xlsx workbooks are exported from it (python landmarkStore.py export)
+LANDMARK_DB = os.getenv('LANDMARK_DB', os.path.join(os.path.dirname(STATUS_FILE), 'landmarks.sqlite'))
+
+# directory listings of the last dataset initialization with their mtimes, see init/initDataset.py
+SCAN_CACHE = os.getenv('SCAN_CACHE', os.path.join(BASE_DIR, 'scan_cache.json'))
+
+# timing spans of the hot paths (1 or 0), the session report is appended to PERF_LOG at exit, see perfTrace.py
+PERF_TRACE = os.getenv('PERF_TRACE', '0') == '1'
+PERF_LOG = os.getenv('PERF_LOG', os.path.join(os.path.dirname(STATUS_FILE), 'perf_log.jsonl'))
+
+# shortest time between two frames of the coalesced camera rendering, in ms (16 is about one 60Hz display frame)
+FRAME_INTERVAL_MS = int(os.getenv('FRAME_INTERVAL_MS', 16))
@@ -0,0 +1,157 @@
+import os
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pydicom
+from config import BASE_DIR, INDEX_FILE
+import volumeCache
+import volumeStore
+
+'''
+    Header only index of the dataset, built with pixel free reads (stop_before_pixels).
+    For every DATASET_*/<individual>/<knee>/<sequence> directory it records the fingerprint of its .dcm files (names, sizes, mtimes,
+    as volumeStore uses), Rows/Columns, the number of slices, the transfer syntaxes, the InstanceNumber
+    ordering of the files and the unreadable files.
+    Entries are keyed by the sequence path relative to BASE_DIR with '/' separators, e.g. DATASET_AXIAL/1/LEFT/pd_tse_fs_tra_320_3.
+    An entry stays valid while its .dcm files are unchanged, files written next to them (<sequence>.json, packed volumes)
+    do not invalidate it. An update only rescans the sequences whose .dcm files changed.
+        python datasetIndex.py [--workers N] [--rebuild]
+'''
+
+INDEX_VERSION = 2
+
+# Walks BASE_DIR/DATASET_*/<individual>/<knee>/<sequence>, yields (dataset, individual, knee, sequence, sequence_path)
+def iter_sequence_dirs(base_dir=BASE_DIR):
+    for dataset in sorted(entry.name for entry in os.scandir(base_dir) if entry.is_dir() and entry.name.startswith('DATASET_')):
+        dataset_path = os.path.join(base_dir, dataset)
+        for individual in sorted((entry.name for entry in os.scandir(dataset_path) if entry.is_dir()), key=lambda x: (not x.isdigit(), int(x) if x.isdigit() else x)):
+            individual_path = os.path.join(dataset_path, individual)
+            for knee in sorted(entry.name for entry in os.scandir(individual_path) if entry.is_dir()):
+                knee_path = os.path.join(individual_path, knee)
+                for sequence in sorted(entry.name for entry in os.scandir(knee_path) if entry.is_dir()):
+                    yield dataset, individual, knee, sequence, os.path.join(knee_path, sequence)
+
+# Index key of a sequence directory
+def sequence_key(sequence_path, base_dir=BASE_DIR):
+    relative = os.path.relpath(os.path.normpath(sequence_path), os.path.normpath(base_dir))
+    return relative.replace('\\', '/')
+
+# Fingerprint of the .dcm files of a sequence, files written next to them (json, packed volumes) leave it unchanged
+def dicom_fingerprint(sequence_path, file_names=None):
+    if file_names is None:
+        file_names = sorted(file_name for file_name in os.listdir(sequence_path) if file_name.endswith('.dcm'))
+    dicom_paths = [os.path.join(sequence_path, file_name) for file_name in file_names]
+    return volumeStore.fingerprint(volumeCache.sequence_key(sequence_path, dicom_paths)[1])
+
+# Header of every .dcm file of a sequence, in the same sorted order DICOMImage uses
+def scan_sequence(sequence_path):
+    file_names = sorted(file_name for file_name in os.listdir(sequence_path) if file_name.endswith('.dcm'))
+    entry = {
+        "Fingerprint": dicom_fingerprint(sequence_path, file_names),
+        "Rows": 0,
+        "Columns": 0,
+        "Slices": len(file_names),
+        "TransferSyntax": [],
+        "Files": file_names,
+        "InstanceOrder": [],
+        "Unreadable": {}
+    }
+    instances = []
+    for file_name in file_names:
+        try:
+            ds = pydicom.dcmread(os.path.join(sequence_path, file_name), stop_before_pixels=True)
+            rows, columns = int(ds.Rows), int(ds.Columns)
+        except Exception as e:
+            entry["Unreadable"][file_name] = str(e)
+            continue
+        # the first readable file gives the volume dimensions, like DICOMImage.load_dicom
+        if not entry["Rows"]:
+            entry["Rows"], entry["Columns"] = rows, columns
+        elif (rows, columns) != (entry["Rows"], entry["Columns"]):
+            entry["Unreadable"][file_name] = f"slice shape {(rows, columns)} does not match volume shape {(entry['Rows'], entry['Columns'])}"
+            continue
+        transfer_syntax = str(getattr(getattr(ds, 'file_meta', None), 'TransferSyntaxUID', ''))
+        if transfer_syntax not in entry["TransferSyntax"]:
+            entry["TransferSyntax"].append(transfer_syntax)
+        instances.append((int(ds.get('InstanceNumber') or 0), file_name))
+    entry["InstanceOrder"] = [file_name for _, file_name in sorted(instances)]
+    return entry
+
+class DatasetIndex:
+    def __init__(self, index_file=INDEX_FILE, base_dir=BASE_DIR):
+        self.index_file = index_file
+        self.base_dir = base_dir
+        self.sequences = {}
+        if os.path.isfile(index_file):
+            try:
+                with open(index_file, 'r') as f:
+                    data = json.load(f)
+                if data.get("Version") == INDEX_VERSION:
+                    self.sequences = data["Sequences"]
+            except Exception as e:
+                print(f"Failed to read dataset index {index_file} due to: {e}")
+
+    # Entry of a sequence directory, None when it is not indexed or its .dcm files changed since.
+    # fingerprint: dicom_fingerprint of the sequence when the caller already stat'ed its files
+    def lookup(self, sequence_path, fingerprint=None):
+        entry = self.sequences.get(sequence_key(sequence_path, self.base_dir))
+        try:
+            if entry is not None and entry["Fingerprint"] == (fingerprint or dicom_fingerprint(sequence_path)):
+                return entry
+        except OSError:
+            pass
+        return None
+
+    # Sequence paths of the index, optionally of one DATASET_* only
+    def sequence_paths(self, dataset=None):
+        return [os.path.join(self.base_dir, *key.split('/')) for key in self.sequences if dataset is None or key.split('/')[0] == dataset]
+
+    # Rescans new and changed sequences, drops removed ones. Returns (added, updated, removed) keys
+    def update(self, workers=None, rebuild=False):
+        current = {}
+        for _, _, _, _, sequence_path in iter_sequence_dirs(self.base_dir):
+            current[sequence_key(sequence_path, self.base_dir)] = sequence_path
+        changed = []
+        for key, sequence_path in current.items():
+            entry = self.sequences.get(key)
+            if rebuild or entry is None or entry["Fingerprint"] != dicom_fingerprint(sequence_path):
+                changed.append(key)
+        removed = [key for key in self.sequences if key not in current]
+        added = [key for key in changed if key not in self.sequences]
+        updated = [key for key in changed if key in self.sequences]
+        # header reads are I/O bound, threads are enough
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            for key, entry in zip(changed, executor.map(scan_sequence, [current[key] for key in changed])):
+                self.sequences[key] = entry
+        for key in removed:
+            del self.sequences[key]
+        return added, updated, removed
+
+    def save(self):
+        tmp_file = self.index_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({"Version": INDEX_VERSION, "Sequences": self.sequences}, f, separators=(',', ':'))
+        os.replace(tmp_file, self.index_file)
+
+_index = None
+_index_lock = threading.Lock()
+
+# Index of the session, read once from INDEX_FILE
+def get_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DatasetIndex()
+        return _index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Builds or incrementally updates the header only dataset index.')
+    parser.add_argument('--workers', type=int, default=None, help='threads reading headers (default: CPU count)')
+    parser.add_argument('--rebuild', action='store_true', help='rescan every sequence')
+    args = parser.parse_args()
+    index = DatasetIndex()
+    added, updated, removed = index.update(args.workers, args.rebuild)
+    index.save()
+    unreadable = sum(len(entry["Unreadable"]) for entry in index.sequences.values())
+    print(f'|-> Dataset index {index.index_file}: {len(index.sequences)} sequences, {len(added)} added, {len(updated)} rescanned, {len(removed)} removed, {unreadable} unreadable files |')
@@ -0,0 +1,146 @@
+import os
+from PyQt5.QtCore import Qt, QTimer, QModelIndex, QPersistentModelIndex
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+from perfTrace import timed
+
+'''
+    Tree of a DATASET_* subset (individual > knee > sequence) populated on demand: only the individuals are listed
+    when a subset is shown, the knees and sequences of a node are listed the first time it is expanded (canFetchMore/fetchMore).
+    Directory listings are cached for the session, switching back to a subset lists nothing again.
+    The Status column of new sequence rows is filled in batches by a zero-interval timer, so expanding never waits on it.
+    Listed sequences are indexed by (individual, knee, sequence), status updates and removals go straight to their row.
+'''
+
+PATH_ROLE = Qt.UserRole + 1
+DEPTH_ROLE = Qt.UserRole + 2
+FETCHED_ROLE = Qt.UserRole + 3
+
+# depth of the items: 0 individual, 1 knee, 2 sequence
+SEQUENCE_DEPTH = 2
+# sequence rows whose status is filled per timer tick
+STATUS_BATCH = 200
+
+class DatasetTreeModel(QStandardItemModel):
+    def __init__(self, status_for, parent=None):
+        super().__init__(parent)
+        self.status_for = status_for # sequence path -> status
+        self.listings = {}
+        self.pending_status = []
+        self.sequence_indexes = {} # (individual, knee, sequence) -> QPersistentModelIndex of the sequence item
+        self.status_timer = QTimer(self)
+        self.status_timer.setInterval(0)
+        self.status_timer.timeout.connect(self.fill_status)
+        self.root_path = None
+
+    # Sorted sub directories of a folder, listed once per session
+    def list_dirs(self, folder_path, depth):
+        key = os.path.normcase(os.path.normpath(folder_path))
+        names = self.listings.get(key)
+        if names is None:
+            try:
+                with os.scandir(folder_path) as entries:
+                    names = [entry.name for entry in entries if entry.is_dir()]
+            except OSError as e:
+                print(f"Failed to list {folder_path} due to: {e}")
+                return []
+            if depth == 0:
+                # individuals are numbered
+                names.sort(key=lambda x: (not x.isdigit(), int(x) if x.isdigit() else x))
+            else:
+                names.sort(key=str.lower)
+            self.listings[key] = names
+        return names
+
+    # Drops the cached listing of a folder, its next expansion lists it again
+    def invalidate_listing(self, folder_path):
+        self.listings.pop(os.path.normcase(os.path.normpath(folder_path)), None)
+
+    # Shows a subset, only its individuals are listed
+    @timed()
+    def set_root(self, subset_path):
+        self.status_timer.stop()
+        self.pending_status.clear()
+        self.sequence_indexes.clear()
+        self.clear()
+        self.setHorizontalHeaderLabels(['Folder', 'Status', 'Landmarks'])
+        self.root_path = subset_path
+        self.append_children(self.invisibleRootItem(), subset_path, 0)
+
+    def append_children(self, parent_item, folder_path, depth):
+        for name in self.list_dirs(folder_path, depth):
+            child_item = QStandardItem(name)
+            child_item.setData(os.path.join(folder_path, name), PATH_ROLE)
+            child_item.setData(depth, DEPTH_ROLE)
+            if depth == SEQUENCE_DEPTH:
+                status_item = QStandardItem()
+                parent_item.appendRow([child_item, status_item])
+                self.pending_status.append(QPersistentModelIndex(status_item.index()))
+                key = (parent_item.parent().text(), parent_item.text(), name)
+                self.sequence_indexes[key] = QPersistentModelIndex(child_item.index())
+            else:
+                parent_item.appendRow(child_item)
+        if self.pending_status and not self.status_timer.isActive():
+            self.status_timer.start()
+
+    # Individuals and knees not listed yet
+    def is_unfetched(self, parent):
+        if not parent.isValid() or parent.column() != 0:
+            return False
+        item = self.itemFromIndex(parent)
+        depth = item.data(DEPTH_ROLE) if item is not None else None
+        return depth is not None and depth < SEQUENCE_DEPTH and not item.data(FETCHED_ROLE)
+
+    # unfetched nodes show an expand arrow without listing their directory
+    def hasChildren(self, parent=QModelIndex()):
+        return self.is_unfetched(parent) or super().hasChildren(parent)
+
+    def canFetchMore(self, parent):
+        return self.is_unfetched(parent)
+
+    @timed()
+    def fetchMore(self, parent):
+        if not self.is_unfetched(parent):
+            return
+        item = self.itemFromIndex(parent)
+        item.setData(True, FETCHED_ROLE)
+        self.append_children(item, item.data(PATH_ROLE), item.data(DEPTH_ROLE) + 1)
+
+    @timed()
+    def fill_status(self):
+        batch = self.pending_status[:STATUS_BATCH]
+        del self.pending_status[:STATUS_BATCH]
+        for status_index in batch:
+            # rows removed meanwhile leave an invalid index
+            if not status_index.isValid():
+                continue
+            status_index = QModelIndex(status_index)
+            sequence_path = self.data(status_index.sibling(status_index.row(), 0), PATH_ROLE)
+            self.setData(status_index, str(self.status_for(sequence_path)))
+        if not self.pending_status:
+            self.status_timer.stop()
+
+    # Index of a listed sequence, None when its knee was never expanded
+    def sequence_index(self, individual, knee, sequence):
+        sequence_index = self.sequence_indexes.get((individual, knee, sequence))
+        if sequence_index is None or not sequence_index.isValid():
+            return None
+        return QModelIndex(sequence_index)
+
+    # Returns the previous status text, None when the sequence is not listed (it reads its status when listed)
+    def set_status(self, individual, knee, sequence, status):
+        sequence_index = self.sequence_index(individual, knee, sequence)
+        if sequence_index is None:
+            return None
+        status_index = sequence_index.sibling(sequence_index.row(), 1)
+        previous = self.data(status_index)
+        self.setData(status_index, str(status))
+        return previous
+
+    # Removes the row of a sequence, returns False when it is not listed
+    def remove_sequence(self, individual, knee, sequence):
+        sequence_index = self.sequence_indexes.pop((individual, knee, sequence), None)
+        if sequence_index is None or not sequence_index.isValid():
+            return False
+        sequence_index = QModelIndex(sequence_index)
+        self.invalidate_listing(os.path.dirname(os.path.normpath(self.data(sequence_index, PATH_ROLE))))
+        return self.removeRow(sequence_index.row(), sequence_index.parent())
@@ -0,0 +1,96 @@
+import atexit
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+import pydicom
+from pydicom.pixel_data_handlers.util import apply_modality_lut, apply_voi_lut
+from config import DECODE_WORKERS, DECODE_BACKEND
+
+'''
+    Decode engine for DICOM sequences. Per file reads and LUT application are spread over a pool of
+    DECODE_WORKERS threads or processes (DECODE_BACKEND), results come back in the order of the given paths.
+    This module stays free of Qt and VTK so process workers only import pydicom and numpy.
+'''
+
+_executor = None
+# the pool is asked for from the GUI, streaming loader and prefetch threads, only one of them creates it
+_executor_lock = threading.Lock()
+
+# voxel type kept for each voxel mode: normalized 0-255 grayscale, or raw modality values for full dynamic range
+VOXEL_DTYPES = {'uint8': np.uint8, '16bit': np.int16}
+
+# normalizing the image intensities between 0 and 255 in order to display as a grayscale image.
+# stack is (slice, row, column) and every slice is scaled by its own min/max, exactly like the per slice formula
+def normalize_slices(stack):
+    low = stack.min(axis=(1, 2), keepdims=True)
+    high = stack.max(axis=(1, 2), keepdims=True)
+    return ((stack - low) * (255.0 / (high - low))).astype('uint8')
+
+# Reads one DICOM file and applies the modality and (unless voi is False) VOI LUTs
+def read_slice(dicom_path, shape=None, voi=True):
+    ds = pydicom.dcmread(dicom_path)
+    arr = ds.pixel_array
+    if shape is not None and arr.shape != tuple(shape):
+        raise ValueError(f"slice shape {arr.shape} does not match volume shape {tuple(shape)}")
+    hu = apply_modality_lut(arr, ds)
+    return apply_voi_lut(hu, ds) if voi else hu
+
+# Slice in the voxel type of the mode, raw modality values are rounded and clipped to the int16 range
+def convert_slice(pixel_array, mode):
+    if mode == '16bit':
+        info = np.iinfo(np.int16)
+        return np.clip(np.rint(pixel_array), info.min, info.max).astype(np.int16)
+    return normalize_slices(pixel_array[np.newaxis])[0]
+
+# Pool task, errors are returned instead of raised so one bad file never cancels the sequence
+def _decode_task(args):
+    dicom_path, shape, mode = args
+    try:
+        pixel_array = read_slice(dicom_path, shape, voi=(mode != '16bit'))
+        return convert_slice(pixel_array, mode), None
+    except Exception as e:
+        return None, str(e)
+
+# Shared pool, created on first use and reused by every sequence of the session
+def get_executor():
+    global _executor
+    if _executor is None and DECODE_WORKERS > 1:
+        with _executor_lock:
+            if _executor is None:
+                if DECODE_BACKEND == 'process':
+                    _executor = ProcessPoolExecutor(max_workers=DECODE_WORKERS)
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix='dicom-decode')
+                atexit.register(_executor.shutdown, wait=False)
+    return _executor
+
+'''
+    Yields (index, dicom_path, pixel_array, error) for every path in dicom_paths order.
+    pixel_array is None and error holds the message when the file could not be decoded.
+    Slices come back in the voxel type of mode (see VOXEL_DTYPES).
+    Only a few tasks per worker are queued ahead, so closing the generator early (a sequence switch
+    while streaming) cancels the rest instead of leaving them on the shared pool.
+'''
+def decode_slices(dicom_paths, shape=None, mode='uint8'):
+    tasks = [(dicom_path, shape, mode) for dicom_path in dicom_paths]
+    executor = get_executor()
+    if executor is None:
+        for i, task in enumerate(tasks):
+            pixel_array, error = _decode_task(task)
+            yield i, task[0], pixel_array, error
+        return
+    ahead = 2 * DECODE_WORKERS
+    futures = deque()
+    try:
+        for i, task in enumerate(tasks):
+            futures.append((i, task[0], executor.submit(_decode_task, task)))
+            if len(futures) >= ahead:
+                j, dicom_path, future = futures.popleft()
+                yield (j, dicom_path) + future.result()
+        while futures:
+            j, dicom_path, future = futures.popleft()
+            yield (j, dicom_path) + future.result()
+    finally:
+        for _, _, future in futures:
+            future.cancel()
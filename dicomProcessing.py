@@ -3,11 +3,17 @@ from vtk.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 import os
 import re
 import json
+import threading
 import pydicom
 import numpy as np
-from pydicom.pixel_data_handlers.util import apply_modality_lut, apply_voi_lut
-import pandas as pd
-from config import EXCEL_PATHS
+import vtk.util.numpy_support as nps
+from config import STREAMING_LOAD, VOLUME_STORE, VOXEL_MODE, MAX_LANDMARKS
+from dicomDecoder import decode_slices, VOXEL_DTYPES
+from volumeCache import volume_cache, sequence_key
+import volumeStore
+from datasetIndex import get_index
+from landmarkStore import get_landmark_store
+from perfTrace import timed
 
 '''
     The DICOM standard specifies the patient coordinate system in a very specific way: the positive X-axis points to the patient's left, 
@@ -16,36 +22,205 @@ from config import EXCEL_PATHS
     In other words, if the patient is lying down in the scanner with their head pointed at the screen and their feet pointing away, 
     their left would be to the right of the screen, their anterior would be to the top of the screen, and their head would be coming out of the screen.            
 '''
-excel_paths = EXCEL_PATHS
+max_landmarks = MAX_LANDMARKS
 
-max_landmarks = {'DATASET_AXIAL':11,'DATASET_SAGITTAL':7,'DATASET_DYNAMIC':18} 
+# kind of voxels kept in volumes (uint8 or 16bit), part of the persistent store validation
+voxel_mode = VOXEL_MODE if VOXEL_MODE in VOXEL_DTYPES else 'uint8'
+
+# Writes a landmarks_record to the sequence json and the landmark store, returns the new status (1).
+# Raises when a write fails, a failed landmark store write reinstates the empty json file first
+@timed()
+def write_landmarks(record):
+    json_file = record["JsonFile"]
+    print('-> Landmarks saved for json file: ', json_file)
+    try: 
+        with open(json_file, "w") as f:
+            json.dump(record["Slices"], f, ensure_ascii=False, indent=4)
+    except Exception as e:
+        print(f"Failed to save data to JSON due to: {e}")
+        raise
+    try:
+        # replaces the row of the sequence, the workbooks are exported from the store (python landmarkStore.py export)
+        get_landmark_store().save(record["Dataset"], record["Individual"], record["Knee"], record["Sequence"], record["Landmarks"])
+    except Exception as e:
+        print(f"Failed to save data to the landmark store due to: {e}")
+        # reinstate the empty json file
+        with open(json_file,'w') as f:
+            json.dump({},f,indent=4)
+        raise
+    return 1
+
+# Empties the sequence json and removes its landmark store row, returns the new status (0)
+@timed()
+def erase_landmarks(record):
+    with open(record["JsonFile"],'w') as f:
+        json.dump({},f,indent=4)
+    get_landmark_store().remove(record["Dataset"], record["Individual"], record["Knee"], record["Sequence"])
+    return 0
+
+# Decodes a sequence into the volume cache ahead of time, without any VTK object, so opening it next is a cache hit.
+# Follows DICOMImage's loading rules (unreadable first files skipped, only complete volumes cached), stops early
+# when stop (threading.Event) is set. Returns True when the volume is cached afterwards
+@timed()
+def prefetch_volume(dicom_dir, stop=None):
+    dicom_paths = [os.path.join(dicom_dir, file_name) for file_name in sorted(os.listdir(dicom_dir)) if file_name.endswith('.dcm')]
+    if not dicom_paths:
+        return False
+    key = sequence_key(dicom_dir, dicom_paths)
+    if key in volume_cache:
+        return True
+    if VOLUME_STORE:
+        stored = volumeStore.load_volume(dicom_dir, key[1], voxel_mode)
+        if stored is not None:
+            header, volume = stored
+            volume_cache.put(key, volume, [os.path.join(dicom_dir, file_name) for file_name in header["Files"]])
+            return True
+    index_entry = get_index().lookup(dicom_dir, volumeStore.fingerprint(key[1]))
+    unreadable = index_entry["Unreadable"] if index_entry is not None else {}
+    shape = None
+    while dicom_paths and shape is None:
+        try:
+            if os.path.basename(dicom_paths[0]) in unreadable:
+                raise ValueError(unreadable[os.path.basename(dicom_paths[0])])
+            if index_entry is not None:
+                shape = (index_entry["Rows"], index_entry["Columns"])
+            else:
+                first_ds = pydicom.dcmread(dicom_paths[0], stop_before_pixels=True)
+                shape = (first_ds.Rows, first_ds.Columns)
+        except Exception:
+            dicom_paths.pop(0)
+    if shape is None or any(os.path.basename(dicom_path) in unreadable for dicom_path in dicom_paths):
+        return False
+    volume = np.zeros((len(dicom_paths),) + tuple(shape), dtype=VOXEL_DTYPES[voxel_mode])
+    slices = decode_slices(dicom_paths, shape, voxel_mode)
+    try:
+        for i, dicom_path, pixel_array, error in slices:
+            if error is not None or (stop is not None and stop.is_set()):
+                return False
+            volume[i] = pixel_array
+    finally:
+        slices.close()
+    volume_cache.put(key, volume, dicom_paths)
+    # a stopped prefetch leaves the sequence alone, it may be about to be removed
+    if VOLUME_STORE and not (stop is not None and stop.is_set()):
+        try:
+            volumeStore.save_volume(dicom_dir, key[1], voxel_mode, volume, dicom_paths)
+        except Exception as e:
+            print(f"Failed to store packed volume for {dicom_dir} due to: {e}")
+    return True
 
 class Landmark:
     def __init__(self, position):
         self.position = position # includes the index
+
+# Every landmark of a volume drawn by a single glyph actor: one point per landmark, with per point Slice and Visible arrays.
+# Only the visible points reach the glyph filter, so add, remove and slice changes just update arrays.
+# slice_points indexes the point ids of every slice, a slice change only switches the old and the new slice's points.
+class LandmarkOverlay:
+    def __init__(self):
+        self.points = vtk.vtkPoints()
+        self.slices = vtk.vtkIntArray()
+        self.slices.SetName("Slice")
+        self.visible = vtk.vtkUnsignedCharArray()
+        self.visible.SetName("Visible")
+        self.polydata = vtk.vtkPolyData()
+        self.polydata.SetPoints(self.points)
+        self.polydata.GetPointData().AddArray(self.slices)
+        self.polydata.GetPointData().AddArray(self.visible)
+        self.slice_points = {}
+        self.current_slice = None
+        self.threshold = vtk.vtkThresholdPoints()
+        self.threshold.SetInputData(self.polydata)
+        self.threshold.SetInputArrayToProcess(0, 0, 0, vtk.vtkDataObject.FIELD_ASSOCIATION_POINTS, "Visible")
+        self.threshold.ThresholdByUpper(0.5)
         self.circle = vtk.vtkRegularPolygonSource()
         self.circle.SetNumberOfSides(50)
-        self.circle.SetCenter(position[0], position[1], 0) 
+        self.circle.SetCenter(0, 0, 0)
         self.circle.SetRadius(1.5)  # Set the radius of the marker
-        #print(f'Landmark index: {self.position[2]}, Landmark center: {self.circle.GetCenter()} , Landmark radius: {self.circle.GetRadius()}')
-        self.circleMapper = vtk.vtkPolyDataMapper()
-        self.circleMapper.SetInputConnection(self.circle.GetOutputPort())
-        self.circleActor = vtk.vtkActor()
-        self.circleActor.SetMapper(self.circleMapper)
+        self.glyph = vtk.vtkGlyph3D()
+        self.glyph.SetSourceConnection(self.circle.GetOutputPort())
+        self.glyph.SetInputConnection(self.threshold.GetOutputPort())
+        self.glyph.ScalingOff()
+        self.glyph.OrientOff()
+        self.mapper = vtk.vtkPolyDataMapper()
+        self.mapper.SetInputConnection(self.glyph.GetOutputPort())
+        self.mapper.ScalarVisibilityOff()
+        self.actor = vtk.vtkActor()
+        self.actor.SetMapper(self.mapper)
         r, g, b = 179/255.0, 29/255.0, 29/255.0  #normalized to 0-1 scale
-        self.circleActor.GetProperty().SetColor(r,g,b)  #b31d1d color
-        
+        self.actor.GetProperty().SetColor(r,g,b)  #b31d1d color
+        self.actor.VisibilityOff()
+
+    # appends one landmark, drawn at z=0 like the displayed slice
+    def add(self, position):
+        self.insert(position, position[2])
+        self.modified()
+
+    # appends many landmarks with a single pipeline update, positions are (x, y, slice)
+    def add_many(self, positions):
+        for position in positions:
+            self.insert(position, position[2])
+        self.modified()
+
+    def insert(self, position, slice_index):
+        slice_index = int(slice_index)
+        point_id = self.points.InsertNextPoint(position[0], position[1], 0)
+        self.slices.InsertNextValue(slice_index)
+        self.visible.InsertNextValue(int(slice_index == self.current_slice))
+        self.slice_points.setdefault(slice_index, []).append(point_id)
+
+    # refills the arrays from a {slice: [landmark, ...]} dict, after removals
+    def rebuild(self, landmarks, current_slice):
+        self.points.Reset()
+        self.slices.Reset()
+        self.visible.Reset()
+        self.slice_points = {}
+        self.current_slice = current_slice
+        for slice_index, lm_list in landmarks.items():
+            for lm in lm_list:
+                self.insert(lm["Position"].position, slice_index)
+        self.modified()
+
+    # only the landmarks of current_slice are visible
+    def set_slice(self, current_slice):
+        if current_slice == self.current_slice:
+            return
+        changed = False
+        for point_id in self.slice_points.get(self.current_slice, []):
+            self.visible.SetValue(point_id, 0)
+            changed = True
+        for point_id in self.slice_points.get(current_slice, []):
+            self.visible.SetValue(point_id, 1)
+            changed = True
+        self.current_slice = current_slice
+        if changed:
+            self.visible.Modified()
+
+    def modified(self):
+        # vtkThresholdPoints complains about an empty input, an empty overlay is simply not drawn
+        self.actor.SetVisibility(self.points.GetNumberOfPoints() > 0)
+        self.points.Modified()
+        self.slices.Modified()
+        self.visible.Modified()
+        self.polydata.Modified()
 
 class DICOMImage:
-    def __init__(self, dicom_dir,ren):
+    @timed('DICOMImage.open')
+    def __init__(self, dicom_dir,ren,streaming=STREAMING_LOAD):
         # DICOM Paths for pydicom parsing
         self.dicom_dir = dicom_dir
         self.dicom_paths = [os.path.join(dicom_dir, file_name) for file_name in sorted(os.listdir(dicom_dir)) if file_name.endswith('.dcm')]
         self.image_data = vtk.vtkImageData()
         self.actor = vtk.vtkImageActor()
+        # the actor's slice mapper reads straight from the volume, scrolling only changes the displayed extent
+        self.actor.SetInputData(self.image_data)
         self.ren = ren
         self.ren.AddActor(self.actor)
         self.landmarks={} 
+        # one actor draws every landmark of the volume
+        self.overlay = LandmarkOverlay()
+        self.overlay.actor.SetUserTransform(self.actor.GetUserTransform())  # Apply the same transformation
+        self.ren.AddActor(self.overlay.actor)
         
         # Image properties
         self.index = 0
@@ -60,9 +235,32 @@ class DICOMImage:
         self.sequence = ''  
         self.extract_components(dicom_dir) # populate them props 
         
-        #first load
-        self.load_dicom()
+        # Streaming state, the volume is filled in by self.loader when streaming
+        self.streaming = streaming
+        self.loaded = np.zeros(len(self.dicom_paths), dtype=bool)
+        self.load_condition = threading.Condition()
+        self.load_finished = True
+        self.stop_loading = threading.Event()
+        self.streamed = False
+        self.loader = None
+        # writer of the packed volume file, waited for before the sequence directory can go away
+        self.store_thread = None
+        self.failed_slices = []
+        self.volume = None
+        self.scalar_range = (0, 255)
+        try:
+            self.cache_key = sequence_key(dicom_dir, self.dicom_paths)
+        except OSError as e:
+            print(f"Volume cache disabled for {dicom_dir}: {str(e)}")
+            self.cache_key = None
+        # header facts of the sequence when the dataset index is up to date for it, checked on the files just stat'ed
+        self.index_entry = get_index().lookup(dicom_dir, volumeStore.fingerprint(self.cache_key[1]) if self.cache_key is not None else None)
+        
+        #first load, straight from the volume cache when the sequence was opened recently, then from its packed volume file
+        if not self.load_cached_volume() and not self.load_stored_volume():
+            self.load_dicom()
         self.update_image()
+        self.init_window_level()
         self.actor.Modified()
         self.center = self.actor.GetCenter()
         # Check if there's a corresponding JSON file with landmarks
@@ -76,63 +274,218 @@ class DICOMImage:
 
     '''  DICOM image iteration Treatment '''  
     
+    @timed()
     def load_dicom(self):
         if not self.dicom_paths:
             print("No valid DICOM images found.")
             return
         try:
-            first_ds = pydicom.dcmread(self.dicom_paths[0])
-            self.image_data.SetDimensions(first_ds.Columns,first_ds.Rows, len(self.dicom_paths))
-            self.image_data.AllocateScalars(vtk.VTK_INT, 1)
-            self.image_data.width = self.width = first_ds.Columns
-            self.image_data.height = self.height = first_ds.Rows 
-            for i, dicom_path in enumerate(self.dicom_paths):
-                try:
-                    ds = pydicom.dcmread(dicom_path)
-                    arr = ds.pixel_array
-                    hu = apply_modality_lut(arr, ds)
-                    pixel_array = apply_voi_lut(hu, ds)
-                    # normalizing the image intensities between 0 and 255 in order to display as a grayscale image.
-                    pixel_array = ((pixel_array - pixel_array.min()) * (255.0 / (pixel_array.max() - pixel_array.min()))).astype('uint8') 
-                    for y in range(arr.shape[0]):
-                        for x in range(arr.shape[1]):
-                            self.image_data.SetScalarComponentFromFloat(x, y, i, 0, pixel_array[y, x])
-                except Exception as e:
-                    print(f"Error reading {dicom_path} during pixel array formation: {str(e)}")
-                    continue
+            # unreadable first files are dropped on the way
+            self.max_slice = len(self.dicom_paths)
+            columns, rows = self.read_dimensions()
+            self.image_data.SetDimensions(columns, rows, len(self.dicom_paths))
+            self.image_data.width = self.width = columns
+            self.image_data.height = self.height = rows
+            # whole volume as (slice, row, column), which is the x-fastest memory layout vtkImageData expects
+            self.set_volume(np.zeros((len(self.dicom_paths), self.height, self.width), dtype=VOXEL_DTYPES[voxel_mode]))
+            self.loaded = np.zeros(len(self.dicom_paths), dtype=bool)
+            if self.streaming:
+                # only the slice shown first is decoded here, a background worker fills in the rest of the volume
+                self.store_slices([self.index])
+                remaining = [i for i in range(len(self.dicom_paths)) if i != self.index]
+                self.load_finished = False
+                self.loader = threading.Thread(target=self.stream_slices, args=(remaining,), daemon=True)
+                self.loader.start()
+            else:
+                self.store_slices(range(len(self.dicom_paths)))
+                self.cache_volume()
                 
         except Exception as e:
             print(f"Error reading {self.dicom_paths[0]}: {str(e)}")   
             self.dicom_paths.pop(0)
             self.load_dicom()
 
+    # Columns/Rows of the volume, from the dataset index when it is up to date, otherwise from the first file header
+    def read_dimensions(self):
+        if self.index_entry is not None:
+            unreadable = self.index_entry["Unreadable"]
+            first_file = os.path.basename(self.dicom_paths[0])
+            if first_file in unreadable:
+                raise ValueError(unreadable[first_file])
+            return self.index_entry["Columns"], self.index_entry["Rows"]
+        first_ds = pydicom.dcmread(self.dicom_paths[0], stop_before_pixels=True)
+        return first_ds.Columns, first_ds.Rows
+
+    # hands the numpy volume to vtkImageData without copying it, self.volume keeps the buffer alive
+    def set_volume(self, volume):
+        self.volume = np.ascontiguousarray(volume)
+        scalars = nps.numpy_to_vtk(self.volume.ravel(), deep=False, array_type=nps.get_vtk_array_type(self.volume.dtype))
+        self.image_data.GetPointData().SetScalars(scalars)
+
+    # decodes the given slices straight into the shared volume buffer and marks them as loaded
+    @timed()
+    def store_slices(self, indexes):
+        # files the dataset index already knows to be unreadable are never opened
+        unreadable = self.index_entry["Unreadable"] if self.index_entry is not None else {}
+        indexes = list(indexes)
+        for i in [i for i in indexes if os.path.basename(self.dicom_paths[i]) in unreadable]:
+            print(f"Error reading {self.dicom_paths[i]} during pixel array formation: {unreadable[os.path.basename(self.dicom_paths[i])]}")
+            self.failed_slices.append(i)
+            with self.load_condition:
+                self.loaded[i] = True
+                self.load_condition.notify_all()
+        indexes = [i for i in indexes if os.path.basename(self.dicom_paths[i]) not in unreadable]
+        dicom_paths = [self.dicom_paths[i] for i in indexes]
+        # slices are decoded and normalized by the decode pool, they come back in dicom_paths order
+        slices = decode_slices(dicom_paths, (self.height, self.width), voxel_mode)
+        try:
+            for j, dicom_path, pixel_array, error in slices:
+                if self.stop_loading.is_set():
+                    break
+                i = indexes[j]
+                if error is not None:
+                    print(f"Error reading {dicom_path} during pixel array formation: {error}")
+                    self.failed_slices.append(i)
+                else:
+                    self.volume[i] = pixel_array
+                with self.load_condition:
+                    self.loaded[i] = True
+                    self.streamed = True
+                    self.load_condition.notify_all()
+        finally:
+            slices.close()
+
+    # background worker of the streaming mode
+    def stream_slices(self, indexes):
+        try:
+            self.store_slices(indexes)
+            self.cache_volume()
+        except Exception as e:
+            print(f"Error streaming {self.dicom_dir}: {str(e)}")
+        finally:
+            with self.load_condition:
+                self.load_finished = True
+                self.load_condition.notify_all()
+
+    # adopts a complete volume, every slice is available at once
+    def adopt_volume(self, volume, dicom_paths):
+        self.dicom_paths = list(dicom_paths)
+        self.max_slice = len(self.dicom_paths)
+        slices, self.height, self.width = volume.shape
+        self.image_data.SetDimensions(self.width, self.height, slices)
+        self.image_data.width = self.width
+        self.image_data.height = self.height
+        self.set_volume(volume)
+        self.loaded = np.ones(slices, dtype=bool)
+
+    # volume of a recently opened sequence
+    @timed()
+    def load_cached_volume(self):
+        cached = volume_cache.get(self.cache_key) if self.cache_key is not None else None
+        if cached is None:
+            return False
+        self.adopt_volume(cached.volume, cached.dicom_paths)
+        print(f'|-> Volume cache hit for {self.dicom_dir} |')
+        return True
+
+    # memory-mapped volume from the persistent store, only when it still matches the .dcm files
+    @timed()
+    def load_stored_volume(self):
+        if not VOLUME_STORE or self.cache_key is None:
+            return False
+        stored = volumeStore.load_volume(self.dicom_dir, self.cache_key[1], voxel_mode)
+        if stored is None:
+            return False
+        header, volume = stored
+        self.adopt_volume(volume, [os.path.join(self.dicom_dir, file_name) for file_name in header["Files"]])
+        volume_cache.put(self.cache_key, volume, self.dicom_paths)
+        print(f'|-> Packed volume loaded for {self.dicom_dir} |')
+        return True
+
+    # only complete volumes are cached, a stopped stream or an unreadable slice could be transient
+    def cache_volume(self):
+        if self.cache_key is not None and not self.stop_loading.is_set() and not self.failed_slices:
+            volume_cache.put(self.cache_key, self.volume, self.dicom_paths)
+            if VOLUME_STORE:
+                self.store_thread = threading.Thread(target=self.store_volume, args=(self.volume, list(self.dicom_paths)))
+                self.store_thread.start()
+
+    # writes the packed volume file, off the GUI thread since the dataset may live on a network share
+    def store_volume(self, volume, dicom_paths):
+        try:
+            volumeStore.save_volume(self.dicom_dir, self.cache_key[1], voxel_mode, volume, dicom_paths)
+        except Exception as e:
+            print(f"Failed to store packed volume for {self.dicom_dir} due to: {e}")
+
+    # drops every reference to the volume buffer (memory-mapped files stay locked on Windows while mapped)
+    def release_volume(self):
+        self.wait_for_store()
+        if self.cache_key is not None:
+            volume_cache.discard(self.cache_key)
+        self.image_data.GetPointData().SetScalars(None)
+        self.volume = None
+
+    # blocks only when the slice has not been decoded yet by the background worker
+    def wait_for_slice(self, index):
+        with self.load_condition:
+            self.load_condition.wait_for(lambda: self.load_finished or self.loaded[index])
+
+    # waits for the packed volume file being written, if any
+    def wait_for_store(self):
+        if self.store_thread is not None:
+            self.store_thread.join()
+            self.store_thread = None
+
+    # stops the background worker, needed before the sequence is replaced or its directory removed
+    def close(self):
+        self.stop_loading.set()
+        if self.loader is not None:
+            self.loader.join()
+        self.wait_for_store()
+
     # next image
     def next_image(self):
-        if self.index < len(self.dicom_paths) - 1:
-            self.index += 1
-            self.update_image()
+        self.set_index(self.index + 1)
                     
     # prev image
     def prev_image(self):
-        if self.index > 0:
-            self.index -= 1
-            self.update_image()     
+        self.set_index(self.index - 1)
+
+    # Shows a slice, clamped to the slices of the volume, returns the index shown
+    def set_index(self, index):
+        index = min(max(index, 0), len(self.dicom_paths) - 1)
+        if index != self.index:
+            self.index = index
+            self.update_image()
+        return self.index
               
     # update slice image        
+    @timed()
     def update_image(self):
-        reslice = vtk.vtkImageReslice()
-        reslice.SetInputData(self.image_data)
-        reslice.SetOutputDimensionality(2)
-        reslice.SetResliceAxesOrigin(0, 0, self.index)
-        reslice.Update()
-        self.actor.GetMapper().SetInputData(reslice.GetOutput())
-        self.actor.Modified()
+        self.wait_for_slice(self.index)
+        # streamed slices were written behind VTK's back, flag the image data as changed
+        if self.streamed:
+            self.streamed = False
+            self.image_data.Modified()
+        # the slice is shifted back to z=0, where the 2D reslice output used to be and the landmarks are drawn
+        self.actor.SetDisplayExtent(0, self.width - 1, 0, self.height - 1, self.index, self.index)
+        self.actor.SetPosition(0, 0, -self.index)
         self.update_landmarks_visibility()
     
     # actor current properties for window/level and constrast on window
     def get_image_property(self):
         return self.actor.GetProperty()
     
+    # window/level start on the full 8-bit range, raw 16bit volumes start on the range of the first shown slice
+    def init_window_level(self):
+        if voxel_mode == 'uint8' or self.volume is None or not len(self.volume):
+            return
+        shown = self.volume[self.index]
+        self.scalar_range = (int(shown.min()), int(shown.max()))
+        low, high = self.scalar_range
+        self.actor.GetProperty().SetColorWindow(max(high - low, 1))
+        self.actor.GetProperty().SetColorLevel((high + low) / 2.0)
+
     # get actor center 
     def get_center(self):
         return self.center
@@ -140,8 +493,7 @@ class DICOMImage:
     ''' Landmark State Treatment '''      
     def add_landmark(self, position):
         landmark = Landmark(position)
-        landmark.circleActor.SetUserTransform(self.actor.GetUserTransform())  # Apply the same transformation
-        self.ren.AddActor(landmark.circleActor)
+        self.overlay.add(position)
         slice_index = position[2]  # z is the slice index, and also the key
         if slice_index not in self.landmarks:
             self.landmarks[slice_index] = []
@@ -150,31 +502,39 @@ class DICOMImage:
             "Position": landmark
         })
         self.landmark_count+=1
-        self.update_landmarks_visibility()
         self.ren.GetRenderWindow().Render()
     
+    # adds many landmarks at once and renders a single time, used when restoring saved landmarks
+    def add_landmarks(self, positions):
+        for position in positions:
+            slice_index = position[2]
+            self.landmarks.setdefault(slice_index, []).append({
+                "Index": self.landmark_count,
+                "Position": Landmark(position)
+            })
+            self.landmark_count+=1
+        self.overlay.add_many(positions)
+        self.ren.GetRenderWindow().Render()
+
     def remove_landmark(self):
         if self.index in self.landmarks and len(self.landmarks[self.index]) > 0:
             removed_landmark = self.landmarks[self.index].pop()
             self.landmark_count-=1
-            # remove the landmark actor from the renderer
-            self.ren.RemoveActor(removed_landmark["Position"].circleActor)
+            # remove the landmark point from the overlay
+            self.overlay.rebuild(self.landmarks, self.index)
             self.ren.GetRenderWindow().Render()
             return True, (removed_landmark["Position"].position)
         return False,()
         
     # Update of the points/landmark visibility, landmark marked on a slice are specific only to that slice
     def update_landmarks_visibility(self):
-        for slice_index, landmarks in self.landmarks.items():
-            for landmark in landmarks:
-                # if the slice index is the current index, the landmark should be visible
-                # else it should be invisible
-                landmark['Position'].circleActor.SetVisibility(slice_index == self.index)
+        # if the slice index is the current index, the landmark should be visible
+        # else it should be invisible
+        self.overlay.set_slice(self.index)
                       
     # Saves the landmarks to the supposed files
-    def save_landmarks(self):
-        json_file = os.path.join(self.dicom_dir, f"{self.sequence}.json")
-        print('-> Landmarks saved for json file: ', json_file)
+    # Plain copy of what a save writes, it no longer depends on the image and can be handed to the save queue
+    def landmarks_record(self):
         # dictionary where each key-value pair represents a slice/frame 
         slice_data_dict = {
             slice_id: {
@@ -193,84 +553,69 @@ class DICOMImage:
             }
             for slice_id, lm_list in self.landmarks.items() if lm_list
         }
-        try: 
-            with open(json_file, "w") as f:
-                json.dump(slice_data_dict, f, ensure_ascii=False, indent=4)
-        except Exception as e:
-            print(f"Failed to save data to JSON due to: {e}")
-            return 0
-        
         combined_landmarks = []
         for slice_id, lm_list in self.landmarks.items():
             for lm in lm_list:
                 combined_landmarks.append((lm["Position"].position[0], lm["Position"].position[1], lm["Index"], slice_id))
         #sort the landmarks to be on the correct order
         combined_landmarks = sorted(combined_landmarks, key=lambda x:x[2])
-        excel_data_dict = {
-                "Dataset": self.dataset_type,
-                "Individual": self.individual,
-                "Knee": self.knee,
-                "Sequence": self.sequence,
-                "Landmarks": combined_landmarks
+        return {
+            "JsonFile": os.path.join(self.dicom_dir, f"{self.sequence}.json"),
+            "Dataset": self.dataset_type,
+            "Individual": self.individual,
+            "Knee": self.knee,
+            "Sequence": self.sequence,
+            "Slices": slice_data_dict,
+            "Landmarks": combined_landmarks
         }
-        try:    
-            excel_file_path = excel_paths[self.dataset_type]        
-            subset_df = pd.read_excel(excel_file_path)
-
-            # Check if sequence exists in the DataFrame and remove rows
-            matching_rows = (subset_df["Individual"] == self.individual) & (subset_df["Sequence"] == self.sequence) & (subset_df["Knee"] == self.knee)
-            if matching_rows.any():
-                subset_df = subset_df[~matching_rows]
-
-            excel_data_dict["Landmarks"] = str(excel_data_dict["Landmarks"])
-            subset_df = subset_df.append(excel_data_dict, ignore_index=True)
-            subset_df.to_excel(excel_file_path, index=False) 
-        except Exception as e:
-            print(f"Failed to save data to Excel  due to: {e}")
-            # reinstate the empty json file
-            with open(json_file,'w') as f:
-                json.dump({},f,indent=4)
-            return 0
-        self.status = 1
+
+    # Writes the landmarks now, or queues the write on save_queue (saveQueue.SaveQueue) keyed by the sequence directory.
+    # Returns 1 once written or queued, 0 when the write failed
+    @timed()
+    def save_landmarks(self, save_queue=None):
+        record = self.landmarks_record()
         # remove slices where there are empty lists
         self.landmarks = {k: v for k,v in self.landmarks.items() if v}
+        if save_queue is None or not save_queue.submit(self.dicom_dir, lambda: write_landmarks(record)):
+            try:
+                write_landmarks(record)
+            except Exception:
+                return 0
+        self.status = 1
         return 1
     
-    # Clear all landmarks marked in every slice and if status 1 clear json 
-    def clear_landmarks(self):
+    # Clear all landmarks marked in every slice and if status 1 clear json and the landmark store row, now or through save_queue
+    @timed()
+    def clear_landmarks(self, save_queue=None):
         self.landmark_count = 1
-        for slice_index, landmarks in self.landmarks.items():
-                for landmark in landmarks:
-                    self.ren.RemoveActor(landmark["Position"].circleActor)
         self.landmarks.clear()    
+        self.overlay.rebuild(self.landmarks, self.index)
         self.ren.GetRenderWindow().Render()
         if self.status == 1:
-            json_file = os.path.join(self.dicom_dir, f"{self.sequence}.json")
-            with open(json_file,'w') as f:
-                json.dump({},f,indent=4)
             self.status = 0
-            excel_file_path = excel_paths[self.dataset_type]        
-            subset_df = pd.read_excel(excel_file_path)
-            # its not removing the landmarks
-            mask = (subset_df["Individual"] == int(self.individual)) & (subset_df["Sequence"] == self.sequence) & (subset_df["Knee"] == self.knee)
-            subset_df = subset_df[~(mask)]
-            subset_df.to_excel(excel_file_path, index=False)
+            record = self.landmarks_record()
+            if save_queue is None or not save_queue.submit(self.dicom_dir, lambda: erase_landmarks(record)):
+                erase_landmarks(record)
             return 1
         return 0  
     # in case of json file exists - only load the landmarks into the images
+    @timed()
     def load_landmarks_from_json(self, json_file):
         with open(json_file, 'r') as file:
             slice_data_dict = json.load(file)
-        
+        # the saved landmarks replace the ones in memory, restoring twice must not duplicate them
+        self.landmarks.clear()
+        self.landmark_count = 1
+        self.overlay.rebuild(self.landmarks, self.index)
+        positions = []
         for slice_id, data in slice_data_dict.items():
             slice_index = int(slice_id)
             landmarks = data["Landmarks"]
             for landmark in landmarks:
-                position = [landmark["Position"][0], landmark["Position"][1], slice_index]
-                self.add_landmark(position)
+                positions.append([landmark["Position"][0], landmark["Position"][1], slice_index])
+        self.add_landmarks(positions)
         
         self.landmark_count = sum(len(landmarks) for landmarks in self.landmarks.values())
-        self.update_landmarks_visibility()     
             
     # Get properties from any images sequence path 
     def extract_components(self,dicom_dir):
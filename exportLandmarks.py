@@ -0,0 +1,182 @@
+import os
+import re
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from config import MAX_LANDMARKS
+from statusStore import read_items
+from landmarkStore import read_rows
+
+'''
+    Headless export of every saved landmark to training-ready arrays, without Qt or VTK. Nothing is created or written
+    but the output: the stores are opened read-only, and when one does not exist yet the files it would import are read.
+    Landmarks are read from the landmark store in one sequential query (the DATASET_*.xlsx workbooks without a store)
+    or, with --source json, from the <sequence>.json file of every labeled sequence of the status store, read in
+    parallel on --workers threads.
+    For each DATASET_* the output directory gets <DATASET>.npz holding:
+        sequence_id, individual, knee, sequence  one row per sequence, sequence_id is the row
+        landmarks  structured table (sequence_id, landmark, slice, x, y), one row per landmark
+        positions  dense (sequences, MAX_LANDMARKS, 3) float32 array of (x, y, slice) by landmark index, NaN where unmarked
+        complete   sequences with exactly MAX_LANDMARKS landmarks, indexes 1..MAX_LANDMARKS
+    and, with --format parquet/both, <DATASET>_landmarks.parquet with the landmark table joined to the sequence columns.
+    Sequences that fail the MAX_LANDMARKS checks are reported, --complete-only leaves them out.
+        python exportLandmarks.py OUTPUT_DIR [--source store|json] [--format npz|parquet|both] [--complete-only] [--workers N]
+'''
+
+LANDMARK_DTYPE = np.dtype([('sequence_id', np.int32), ('landmark', np.int16), ('slice', np.int32), ('x', np.float32), ('y', np.float32)])
+
+SEQUENCE_PATTERN = re.compile(r"(?P<Dataset>DATASET_\w+)[\\/](?P<Individual>\d+)[\\/](?P<Knee>LEFT|RIGHT)[\\/](?P<Sequence>[\w-]+)[\\/]*")
+
+# (dataset, individual, knee, sequence) of a sequence path, None when it does not follow the dataset layout
+def sequence_components(sequence_path):
+    match = SEQUENCE_PATTERN.search(sequence_path)
+    if match is None:
+        return None
+    return match.group('Dataset'), match.group('Individual'), match.group('Knee'), match.group('Sequence')
+
+# individuals are numbered
+def sequence_order(key):
+    individual, knee, sequence = key
+    return (not individual.isdigit(), int(individual) if individual.isdigit() else individual, knee, sequence)
+
+# (dataset, individual, knee, sequence, landmarks) of every row of the landmark store, landmarks as (x, y, index, slice)
+def read_store():
+    return read_rows()
+
+# Landmarks of a sequence json file as (x, y, index, slice), None when it cannot be read
+def read_json(sequence_path):
+    components = sequence_components(sequence_path)
+    if components is None:
+        print(f"|Error|-> Failed to extract components from sequence path: {sequence_path}")
+        return None
+    json_file = os.path.join(sequence_path, f"{components[3]}.json")
+    try:
+        with open(json_file, 'r') as f:
+            slice_data_dict = json.load(f)
+    except Exception as e:
+        print(f"Failed to read {json_file} due to: {e}")
+        return None
+    landmarks = [(lm["Position"][0], lm["Position"][1], lm["Index"], int(slice_id))
+                 for slice_id, data in slice_data_dict.items() for lm in data["Landmarks"]]
+    return components + (sorted(landmarks, key=lambda lm: lm[2]),)
+
+# labeled sequences of the status store, their json files read on a thread pool
+def read_json_files(workers=None):
+    labeled = [path for path, status in read_items() if status == 1]
+    with ThreadPoolExecutor(max_workers=workers or min(32, (os.cpu_count() or 1) * 4)) as executor:
+        return [row for row in executor.map(read_json, labeled) if row is not None]
+
+# Problems of a sequence against the landmarks expected for its subset, empty when it is complete
+def check_landmarks(landmarks, max_count):
+    problems = []
+    indexes = [lm[2] for lm in landmarks]
+    if len(indexes) != len(set(indexes)):
+        problems.append('duplicate landmark indexes')
+    if any(index < 1 or index > max_count for index in indexes):
+        problems.append(f'landmark indexes outside 1..{max_count}')
+    if len(landmarks) != max_count:
+        problems.append(f'{len(landmarks)} of {max_count} landmarks')
+    return problems
+
+# Arrays of one subset, rows: {(individual, knee, sequence): landmarks}
+def build_arrays(rows, max_count):
+    keys = sorted(rows, key=sequence_order)
+    positions = np.full((len(keys), max_count, 3), np.nan, dtype=np.float32)
+    complete = np.zeros(len(keys), dtype=bool)
+    table = np.empty(sum(len(rows[key]) for key in keys), dtype=LANDMARK_DTYPE)
+    problems = {}
+    row = 0
+    for sequence_id, key in enumerate(keys):
+        landmarks = rows[key]
+        sequence_problems = check_landmarks(landmarks, max_count)
+        if sequence_problems:
+            problems[key] = sequence_problems
+        complete[sequence_id] = not sequence_problems
+        for x, y, index, slice_index in landmarks:
+            table[row] = (sequence_id, index, slice_index, x, y)
+            row += 1
+            if 1 <= index <= max_count:
+                positions[sequence_id, index - 1] = (x, y, slice_index)
+    return {
+        "sequence_id": np.arange(len(keys), dtype=np.int32),
+        "individual": np.array([key[0] for key in keys], dtype=str),
+        "knee": np.array([key[1] for key in keys], dtype=str),
+        "sequence": np.array([key[2] for key in keys], dtype=str),
+        "landmarks": table,
+        "positions": positions,
+        "complete": complete
+    }, problems
+
+# keeps only the complete sequences, renumbered
+def complete_only(arrays):
+    kept = np.flatnonzero(arrays["complete"])
+    renumber = np.full(len(arrays["complete"]), -1, dtype=np.int32)
+    renumber[kept] = np.arange(len(kept), dtype=np.int32)
+    table = arrays["landmarks"][arrays["complete"][arrays["landmarks"]["sequence_id"]]]
+    table["sequence_id"] = renumber[table["sequence_id"]]
+    return {
+        "sequence_id": np.arange(len(kept), dtype=np.int32),
+        "individual": arrays["individual"][kept],
+        "knee": arrays["knee"][kept],
+        "sequence": arrays["sequence"][kept],
+        "landmarks": table,
+        "positions": arrays["positions"][kept],
+        "complete": arrays["complete"][kept]
+    }
+
+def write_parquet(arrays, parquet_path):
+    import pandas as pd
+    table = arrays["landmarks"]
+    ids = table["sequence_id"]
+    frame = pd.DataFrame({
+        "sequence_id": ids,
+        "individual": arrays["individual"][ids],
+        "knee": arrays["knee"][ids],
+        "sequence": arrays["sequence"][ids],
+        "landmark": table["landmark"],
+        "slice": table["slice"],
+        "x": table["x"],
+        "y": table["y"]
+    })
+    frame.to_parquet(parquet_path, index=False)
+
+def export_landmarks(output_dir, source='store', output_format='npz', only_complete=False, workers=None):
+    start = time.perf_counter()
+    rows = read_store() if source == 'store' else read_json_files(workers)
+    read_time = time.perf_counter() - start
+    subsets = {}
+    for dataset, individual, knee, sequence, landmarks in rows:
+        if dataset not in MAX_LANDMARKS:
+            print(f"|Error|-> Unknown dataset {dataset} for {individual}/{knee}/{sequence}, skipped")
+            continue
+        subsets.setdefault(dataset, {})[(str(individual), knee, sequence)] = landmarks
+
+    os.makedirs(output_dir, exist_ok=True)
+    for dataset in sorted(subsets):
+        arrays, problems = build_arrays(subsets[dataset], MAX_LANDMARKS[dataset])
+        for (individual, knee, sequence), sequence_problems in sorted(problems.items(), key=lambda item: sequence_order(item[0])):
+            print(f"|-> {dataset}/{individual}/{knee}/{sequence}: {', '.join(sequence_problems)} |")
+        if only_complete:
+            arrays = complete_only(arrays)
+        if output_format in ('npz', 'both'):
+            np.savez(os.path.join(output_dir, f"{dataset}.npz"), **arrays)
+        if output_format in ('parquet', 'both'):
+            try:
+                write_parquet(arrays, os.path.join(output_dir, f"{dataset}_landmarks.parquet"))
+            except ImportError as e:
+                print(f"Failed to write Parquet for {dataset} due to: {e} (install pyarrow or fastparquet)")
+        print(f'|-> {dataset}: {len(arrays["sequence_id"])} sequences, {len(arrays["landmarks"])} landmarks, '
+              f'{int(arrays["complete"].sum())} complete, {len(problems)} failing the {MAX_LANDMARKS[dataset]} landmarks checks |')
+    print(f'|-> Exported {len(rows)} sequences from the {source} to {output_dir} in {time.perf_counter() - start:.2f}s (read {read_time:.2f}s) |')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Exports every saved landmark to NumPy/Parquet tables per DATASET_*.')
+    parser.add_argument('output_dir')
+    parser.add_argument('--source', choices=['store', 'json'], default='store', help='landmark store (default) or the json file of every labeled sequence')
+    parser.add_argument('--format', choices=['npz', 'parquet', 'both'], default='npz')
+    parser.add_argument('--complete-only', action='store_true', help=f'only the sequences with all their landmarks ({MAX_LANDMARKS})')
+    parser.add_argument('--workers', type=int, default=None, help='threads reading the json files (--source json only)')
+    args = parser.parse_args()
+    export_landmarks(args.output_dir, args.source, args.format, args.complete_only, args.workers)
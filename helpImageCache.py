@@ -0,0 +1,92 @@
+import os
+import threading
+from PyQt5.QtCore import Qt, QObject, pyqtSignal
+from PyQt5.QtGui import QImageReader, QPixmap
+
+'''
+    Help images of every subset (and knee for DATASET_AXIAL) decoded and scaled to HELP_IMAGE_SIZE once.
+    A background thread decodes and scales QImages, which is allowed outside the GUI thread. The ready images are
+    handed over with a signal and turned into QPixmaps on the GUI thread, then kept per (subset, knee) in landmark order.
+    Landmark clicks only swap ready pixmaps, an image asked for before its set is ready is decoded on the spot.
+'''
+
+HELP_IMAGE_SIZE = 320
+
+# (subset, knee) of the help images of a sequence, only the axial subset has per knee help images
+def help_key(subset, knee):
+    return (subset, knee if subset == 'DATASET_AXIAL' else None)
+
+# Help image paths of a (subset, knee), in landmark order
+def help_image_paths(help_path, key):
+    subset, knee = key
+    help_folder = os.path.join(help_path, subset, knee) if knee else os.path.join(help_path, subset)
+    # ascending sort
+    file_paths = sorted(os.listdir(help_folder), key=lambda x: int(x.split('.')[0]))
+    return [os.path.join(help_folder, file_path) for file_path in file_paths if file_path.endswith(".png")]
+
+def read_scaled_image(image_path):
+    image = QImageReader(image_path).read()
+    return image.scaled(HELP_IMAGE_SIZE, HELP_IMAGE_SIZE, Qt.KeepAspectRatio)
+
+class HelpImageCache(QObject):
+    # (key, list of scaled QImages) from the decode thread
+    imagesDecoded = pyqtSignal(object, object)
+
+    def __init__(self, help_path, parent=None):
+        super().__init__(parent)
+        self.help_path = help_path
+        self.paths = {} # key -> help image paths
+        self.pixmaps = {} # key -> {index: QPixmap}
+        self.requested = set()
+        self.imagesDecoded.connect(self.store_images)
+
+    def image_paths(self, key):
+        if key not in self.paths:
+            self.paths[key] = help_image_paths(self.help_path, key)
+        return self.paths[key]
+
+    # every (subset, knee) found under the help folder
+    def keys(self):
+        keys = []
+        for subset in sorted(os.listdir(self.help_path)):
+            subset_path = os.path.join(self.help_path, subset)
+            if not os.path.isdir(subset_path):
+                continue
+            if subset == 'DATASET_AXIAL':
+                keys.extend((subset, knee) for knee in sorted(os.listdir(subset_path)) if os.path.isdir(os.path.join(subset_path, knee)))
+            else:
+                keys.append((subset, None))
+        return keys
+
+    # Decodes the given (subset, knee) sets, all of them by default, on a background thread
+    def preload(self, keys=None):
+        keys = [key for key in (self.keys() if keys is None else keys) if key not in self.requested]
+        if not keys:
+            return
+        self.requested.update(keys)
+        # listings happen here, the dict is only touched from the GUI thread
+        jobs = []
+        for key in keys:
+            try:
+                jobs.append((key, self.image_paths(key)))
+            except OSError as e:
+                print(f"Failed to list help images of {key} due to: {e}")
+        threading.Thread(target=self.decode, args=(jobs,), daemon=True).start()
+
+    def decode(self, jobs):
+        for key, image_paths in jobs:
+            self.imagesDecoded.emit(key, [read_scaled_image(image_path) for image_path in image_paths])
+
+    # GUI thread, QPixmaps may only be created here
+    def store_images(self, key, images):
+        pixmaps = self.pixmaps.setdefault(key, {})
+        for index, image in enumerate(images):
+            if index not in pixmaps:
+                pixmaps[index] = QPixmap.fromImage(image)
+
+    # Ready pixmap of a help image, decoded now when its set is still on its way
+    def pixmap(self, key, index):
+        pixmaps = self.pixmaps.setdefault(key, {})
+        if index not in pixmaps:
+            pixmaps[index] = QPixmap.fromImage(read_scaled_image(self.image_paths(key)[index]))
+        return pixmaps[index]
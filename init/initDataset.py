@@ -0,0 +1,127 @@
+''' Script that initializes the dataset for LabelingGUI, and updates it when sequences are added
+    Replaces jsonCreate.py and initStatus.py, running it again never touches existing labels:
+        - every DATASET_* subset is scanned concurrently
+        - new sequences get an empty <sequence>.json when they have none, and status 0 in the status store
+        - sequences already in the status store keep their status and their json file
+    Directory listings are cached with their mtimes in SCAN_CACHE, a re-scan of an unchanged dataset only stats directories.
+        python -m init.initDataset [--workers N] [--index] [--dry-run]
+'''
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from config import BASE_DIR, SCAN_CACHE
+from statusStore import StatusStore, normalize_path, read_paths
+from datasetIndex import DatasetIndex
+
+# individuals are numbered
+def individual_key(name):
+    return (not name.isdigit(), int(name) if name.isdigit() else name)
+
+def load_scan_cache(scan_cache=SCAN_CACHE):
+    if os.path.isfile(scan_cache):
+        try:
+            with open(scan_cache, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Failed to read scan cache {scan_cache} due to: {e}")
+    return {}
+
+def save_scan_cache(cache, scan_cache=SCAN_CACHE):
+    tmp_file = scan_cache + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f, separators=(',', ':'))
+    os.replace(tmp_file, scan_cache)
+
+# Sub directories of a folder, from the cache while the folder mtime is unchanged
+def list_dirs(folder_path, cache, listings, counts):
+    key = normalize_path(folder_path)
+    mtime = os.stat(folder_path).st_mtime_ns
+    entry = cache.get(key)
+    if entry is not None and entry["Mtime"] == mtime:
+        counts["Cached"] += 1
+    else:
+        with os.scandir(folder_path) as entries:
+            entry = {"Mtime": mtime, "Dirs": [item.name for item in entries if item.is_dir()]}
+        counts["Listed"] += 1
+    listings[key] = entry
+    return entry["Dirs"]
+
+# Sequence paths of a subset in individual -> knee -> sequence order, with the listings it used
+def scan_subset(dataset_path, cache):
+    listings = {}
+    counts = {"Listed": 0, "Cached": 0}
+    sequence_paths = []
+    for individual in sorted(list_dirs(dataset_path, cache, listings, counts), key=individual_key):
+        individual_path = os.path.join(dataset_path, individual)
+        # knee folders left -> right
+        for knee in sorted(list_dirs(individual_path, cache, listings, counts)):
+            knee_path = os.path.join(individual_path, knee)
+            for sequence in sorted(list_dirs(knee_path, cache, listings, counts)):
+                sequence_paths.append(os.path.join(knee_path, sequence))
+    return sequence_paths, listings, counts
+
+# Empty landmark file of a new sequence, an existing file is never overwritten
+def create_json(sequence_path):
+    json_file_path = os.path.join(sequence_path, f"{os.path.basename(sequence_path)}.json")
+    try:
+        with open(json_file_path, "x") as json_file:
+            json.dump({}, json_file)
+        return True
+    except FileExistsError:
+        return False
+
+def init_dataset(workers=None, dry_run=False, update_index=False):
+    start = time.perf_counter()
+    datasets = sorted(entry.name for entry in os.scandir(BASE_DIR) if entry.is_dir() and entry.name.startswith('DATASET_'))
+    cache = load_scan_cache()
+    with ThreadPoolExecutor(max_workers=workers or len(datasets) or 1) as executor:
+        results = list(executor.map(lambda dataset: scan_subset(os.path.join(BASE_DIR, dataset), cache), datasets))
+
+    # a dry run never creates the store nor imports STATUS_FILE into it
+    store = None if dry_run else StatusStore()
+    stored_paths = read_paths() if dry_run else store.paths()
+    known = {normalize_path(path) for path in stored_paths}
+    found = set()
+    new_sequences = []
+    listings = {}
+    counts = {"Listed": 0, "Cached": 0}
+    for dataset, (sequence_paths, subset_listings, subset_counts) in zip(datasets, results):
+        listings.update(subset_listings)
+        for key in counts:
+            counts[key] += subset_counts[key]
+        subset_new = [sequence_path for sequence_path in sequence_paths if normalize_path(sequence_path) not in known]
+        print(f'|-> {dataset}: {len(sequence_paths)} sequences, {len(subset_new)} new |')
+        found.update(normalize_path(sequence_path) for sequence_path in sequence_paths)
+        new_sequences.extend(subset_new)
+    missing = [path for path in stored_paths if normalize_path(path) not in found]
+
+    created = 0
+    if not dry_run:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            created = sum(executor.map(create_json, new_sequences))
+        store.add_missing(new_sequences, 0)
+        # only the listings of this scan are kept, removed folders drop out of the cache
+        save_scan_cache(listings)
+        store.close()
+
+    for path in missing:
+        print(f'|-> In the status store but not on disk (kept): {path} |')
+    print(f'|-> {"Would add" if dry_run else "Added"} {len(new_sequences)} sequences ({created} json files created), '
+          f'{len(missing)} missing on disk, {counts["Listed"]} directories listed, {counts["Cached"]} from cache, {time.perf_counter() - start:.2f}s |')
+
+    if update_index and not dry_run:
+        index = DatasetIndex()
+        added, updated, removed = index.update(workers)
+        index.save()
+        print(f'|-> Dataset index {index.index_file}: {len(added)} added, {len(updated)} rescanned, {len(removed)} removed |')
+    return new_sequences, missing
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Adds new sequences to the status store and creates their empty json files, existing labels are kept.')
+    parser.add_argument('--workers', type=int, default=None, help='threads (default: one per subset for the scan, CPU count for the json files)')
+    parser.add_argument('--index', action='store_true', help='also update the header only dataset index (datasetIndex.py)')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing anything')
+    args = parser.parse_args()
+    init_dataset(args.workers, args.dry_run, args.index)
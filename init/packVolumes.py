@@ -0,0 +1,113 @@
+''' Script that converts every sequence of the dataset into its packed volume file (volumeStore.py) ahead of the labeling
+    Decode and normalization are paid once on a batch machine, DICOMImage then memory-maps the .vol files instead of
+    decoding the .dcm files on every workstation. Sequences are converted on a process pool with the exact slice
+    conversion of DICOMImage.load_dicom (dicomDecoder.read_slice/convert_slice) in the voxel mode of VOXEL_MODE or --mode.
+        - a packed file newer than the .dcm files of its sequence, with their fingerprint and the same mode, is skipped
+        - files are written through a temporary file, an interrupted run is resumed by running it again
+        - sequences with an unreadable slice are reported and left unpacked, like DICOMImage never stores them
+        python -m init.packVolumes [--dataset DATASET_AXIAL] [--workers N] [--mode uint8|16bit] [--force]
+'''
+import os
+import time
+import argparse
+from multiprocessing import Pool
+import numpy as np
+import pydicom
+from config import BASE_DIR, VOXEL_MODE, VOLUME_STORE
+from datasetIndex import iter_sequence_dirs
+from dicomDecoder import VOXEL_DTYPES, read_slice, convert_slice
+from volumeCache import sequence_key
+import volumeStore
+
+# seconds between progress lines
+PROGRESS_INTERVAL = 5.0
+
+# True when the packed file of a sequence is newer than its sources and still matches them
+def is_up_to_date(path, files, mode):
+    if not os.path.isfile(path):
+        return False
+    try:
+        header = volumeStore.read_header(path)
+    except Exception:
+        return False
+    newest = max(mtime for _, _, mtime in files)
+    return (os.stat(path).st_mtime_ns >= newest and header.get('Mode') == mode
+            and header.get('Fingerprint') == volumeStore.fingerprint(files))
+
+# Worker: (sequence_path, outcome, bytes written, message), outcome is packed, skipped, failed or empty
+def pack_sequence(args):
+    sequence_path, mode, force = args
+    try:
+        dicom_paths = [os.path.join(sequence_path, file_name) for file_name in sorted(os.listdir(sequence_path)) if file_name.endswith('.dcm')]
+        if not dicom_paths:
+            return sequence_path, 'empty', 0, 'no .dcm files'
+        files = sequence_key(sequence_path, dicom_paths)[1]
+        path = volumeStore.volume_path(sequence_path)
+        # leftover of an interrupted write
+        if os.path.isfile(path + '.tmp'):
+            os.remove(path + '.tmp')
+        if not force and is_up_to_date(path, files, mode):
+            return sequence_path, 'skipped', 0, ''
+        # like load_dicom, unreadable first files are dropped and the first readable header gives the volume shape
+        shape = None
+        while dicom_paths and shape is None:
+            try:
+                first_ds = pydicom.dcmread(dicom_paths[0], stop_before_pixels=True)
+                shape = (first_ds.Rows, first_ds.Columns)
+            except Exception:
+                dicom_paths.pop(0)
+        if shape is None:
+            return sequence_path, 'failed', 0, 'no readable DICOM header'
+        volume = np.zeros((len(dicom_paths),) + shape, dtype=VOXEL_DTYPES[mode])
+        for i, dicom_path in enumerate(dicom_paths):
+            try:
+                volume[i] = convert_slice(read_slice(dicom_path, shape, voi=(mode != '16bit')), mode)
+            except Exception as e:
+                return sequence_path, 'failed', 0, f'{os.path.basename(dicom_path)}: {e}'
+        volumeStore.save_volume(sequence_path, files, mode, volume, dicom_paths)
+        return sequence_path, 'packed', volumeStore.HEADER_SIZE + volume.nbytes, ''
+    except Exception as e:
+        return sequence_path, 'failed', 0, str(e)
+
+def pack_volumes(dataset=None, workers=None, mode=VOXEL_MODE, force=False):
+    start = time.perf_counter()
+    if not VOLUME_STORE:
+        print('|-> VOLUME_STORE is 0, the packed volumes are written but DICOMImage will not read them |')
+    sequence_paths = [path for subset, _, _, _, path in iter_sequence_dirs(BASE_DIR) if dataset is None or subset == dataset]
+    counts = {"packed": 0, "skipped": 0, "failed": 0, "empty": 0}
+    written = 0
+    done = 0
+    last_progress = start
+    pool = Pool(processes=workers or os.cpu_count() or 1)
+    try:
+        for sequence_path, outcome, nbytes, message in pool.imap_unordered(pack_sequence, [(path, mode, force) for path in sequence_paths]):
+            done += 1
+            counts[outcome] += 1
+            written += nbytes
+            if outcome == 'failed':
+                print(f'|Error|-> {sequence_path}: {message}')
+            now = time.perf_counter()
+            if now - last_progress >= PROGRESS_INTERVAL:
+                last_progress = now
+                rate = done / (now - start)
+                print(f'|-> {done}/{len(sequence_paths)} sequences, {counts["packed"]} packed, {counts["skipped"]} up to date, '
+                      f'{counts["failed"]} failed, {rate:.1f}/s, about {(len(sequence_paths) - done) / rate:.0f}s left |')
+        pool.close()
+    except KeyboardInterrupt:
+        pool.terminate()
+        print('|-> Interrupted, run again to resume: packed sequences are skipped |')
+    finally:
+        pool.join()
+    print(f'|-> {done}/{len(sequence_paths)} sequences: {counts["packed"]} packed ({written / 2**20:.1f} MB), {counts["skipped"]} up to date, '
+          f'{counts["failed"]} failed, {counts["empty"]} without .dcm files, {time.perf_counter() - start:.2f}s |')
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Converts every sequence into a packed volume file, up to date ones are skipped.')
+    parser.add_argument('--dataset', default=None, help='only this DATASET_* subset')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: CPU count)')
+    parser.add_argument('--mode', choices=sorted(VOXEL_DTYPES), default=VOXEL_MODE if VOXEL_MODE in VOXEL_DTYPES else 'uint8',
+                        help='voxel mode, must match the VOXEL_MODE of the workstations')
+    parser.add_argument('--force', action='store_true', help='repack up to date sequences too')
+    args = parser.parse_args()
+    pack_volumes(args.dataset, args.workers, args.mode, args.force)
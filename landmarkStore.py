@@ -0,0 +1,178 @@
+import os
+import ast
+import json
+import sqlite3
+import argparse
+import threading
+from urllib.request import pathname2url
+from config import LANDMARK_DB, EXCEL_PATHS
+from perfTrace import timed
+
+'''
+    Saved landmarks of every sequence kept in SQLite, one row per sequence indexed by dataset/individual/knee/sequence.
+    Saving or clearing a sequence is a single row change, the DATASET_*.xlsx workbooks are no longer read and rewritten
+    on every save. The workbooks are produced on demand with the same columns (Dataset, Individual, Knee, Sequence, Landmarks),
+    Landmarks being the (x, y, index, slice) tuples ordered by index. A new store imports the existing workbooks.
+        python landmarkStore.py export [--dataset DATASET_AXIAL]
+        python landmarkStore.py import [--dataset DATASET_AXIAL]
+'''
+
+EXCEL_COLUMNS = ["Dataset", "Individual", "Knee", "Sequence", "Landmarks"]
+
+class LandmarkStore:
+    def __init__(self, db_path=LANDMARK_DB, excel_paths=EXCEL_PATHS):
+        self.db_path = db_path
+        # saves run on the save queue's writer thread, the lock serializes them with the Qt thread
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            # rows are kept in save order through the implicit rowid, a new save goes to the end like the old appends
+            self.connection.execute('CREATE TABLE IF NOT EXISTS landmarks (dataset TEXT NOT NULL, individual TEXT NOT NULL, knee TEXT NOT NULL, sequence TEXT NOT NULL, landmarks TEXT NOT NULL, PRIMARY KEY (dataset, individual, knee, sequence))')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        # the workbooks are imported once, a store emptied by clears/removals must not get the old rows back
+        if self.get_meta('WorkbooksImported') is None:
+            if not self.count() and excel_paths:
+                for dataset, excel_path in excel_paths.items():
+                    if os.path.isfile(excel_path):
+                        imported = self.import_excel(dataset, excel_path)
+                        print(f'|-> Imported {imported} sequence landmarks from {excel_path} into {db_path} |')
+            self.set_meta('WorkbooksImported', '1')
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key, value):
+        with self.lock, self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def count(self, dataset=None):
+        with self.lock:
+            if dataset is None:
+                return self.connection.execute('SELECT COUNT(*) FROM landmarks').fetchone()[0]
+            return self.connection.execute('SELECT COUNT(*) FROM landmarks WHERE dataset = ?', (dataset,)).fetchone()[0]
+
+    # landmarks: (x, y, index, slice) tuples
+    @timed()
+    def save(self, dataset, individual, knee, sequence, landmarks):
+        with self.lock, self.connection:
+            self._save(dataset, individual, knee, sequence, landmarks)
+
+    def _save(self, dataset, individual, knee, sequence, landmarks):
+        key = (dataset, str(individual), knee, sequence)
+        self.connection.execute('DELETE FROM landmarks WHERE dataset = ? AND individual = ? AND knee = ? AND sequence = ?', key)
+        self.connection.execute('INSERT INTO landmarks (dataset, individual, knee, sequence, landmarks) VALUES (?, ?, ?, ?, ?)', key + (json.dumps([list(lm) for lm in landmarks]),))
+
+    @timed()
+    def remove(self, dataset, individual, knee, sequence):
+        with self.lock, self.connection:
+            self.connection.execute('DELETE FROM landmarks WHERE dataset = ? AND individual = ? AND knee = ? AND sequence = ?', (dataset, str(individual), knee, sequence))
+
+    # (x, y, index, slice) tuples of a sequence, None when it has no saved landmarks
+    def get(self, dataset, individual, knee, sequence):
+        with self.lock:
+            row = self.connection.execute('SELECT landmarks FROM landmarks WHERE dataset = ? AND individual = ? AND knee = ? AND sequence = ?', (dataset, str(individual), knee, sequence)).fetchone()
+        return [tuple(lm) for lm in json.loads(row[0])] if row is not None else None
+
+    # (dataset, individual, knee, sequence, landmarks) rows in save order, optionally of one DATASET_* only
+    def rows(self, dataset=None):
+        with self.lock:
+            if dataset is None:
+                rows = self.connection.execute('SELECT dataset, individual, knee, sequence, landmarks FROM landmarks ORDER BY rowid').fetchall()
+            else:
+                rows = self.connection.execute('SELECT dataset, individual, knee, sequence, landmarks FROM landmarks WHERE dataset = ? ORDER BY rowid', (dataset,)).fetchall()
+        for row_dataset, individual, knee, sequence, landmarks in rows:
+            yield row_dataset, individual, knee, sequence, [tuple(lm) for lm in json.loads(landmarks)]
+
+    # Merges a DATASET_*.xlsx workbook in one transaction, returns the number of rows read
+    def import_excel(self, dataset, excel_path):
+        rows = read_excel(excel_path)
+        with self.lock, self.connection:
+            for individual, knee, sequence, landmarks in rows:
+                # every workbook holds a single dataset
+                self._save(dataset, individual, knee, sequence, landmarks)
+        return len(rows)
+
+    # Writes the workbook of one DATASET_* with today's columns, through a temporary file
+    @timed()
+    def export_excel(self, dataset, excel_path):
+        import pandas as pd
+        records = [
+            {
+                "Dataset": row_dataset,
+                "Individual": int(individual) if individual.isdigit() else individual,
+                "Knee": knee,
+                "Sequence": sequence,
+                "Landmarks": str(landmarks)
+            }
+            for row_dataset, individual, knee, sequence, landmarks in self.rows(dataset)
+        ]
+        tmp_path = os.path.splitext(excel_path)[0] + '.tmp.xlsx'
+        pd.DataFrame(records, columns=EXCEL_COLUMNS).to_excel(tmp_path, index=False)
+        os.replace(tmp_path, excel_path)
+        return len(records)
+
+    def close(self):
+        self.connection.close()
+
+# (individual, knee, sequence, landmarks) rows of a DATASET_*.xlsx workbook
+def read_excel(excel_path):
+    import pandas as pd
+    rows = []
+    for _, row in pd.read_excel(excel_path).iterrows():
+        landmarks = row["Landmarks"]
+        landmarks = ast.literal_eval(landmarks) if isinstance(landmarks, str) else []
+        individual = row["Individual"]
+        # a column with empty cells comes back as float
+        if isinstance(individual, float) and individual.is_integer():
+            individual = int(individual)
+        rows.append((individual, row["Knee"], row["Sequence"], [tuple(lm) for lm in landmarks]))
+    return rows
+
+# Stored (dataset, individual, knee, sequence, landmarks) rows without creating or writing anything: the store opened
+# read-only, or when there is no store yet the workbooks a new store would import
+def read_rows(db_path=LANDMARK_DB, excel_paths=EXCEL_PATHS):
+    if os.path.isfile(db_path):
+        connection = sqlite3.connect(f'file:{pathname2url(os.path.abspath(db_path))}?mode=ro', uri=True)
+        try:
+            rows = connection.execute('SELECT dataset, individual, knee, sequence, landmarks FROM landmarks ORDER BY rowid').fetchall()
+        finally:
+            connection.close()
+        return [(dataset, individual, knee, sequence, [tuple(lm) for lm in json.loads(landmarks)])
+                for dataset, individual, knee, sequence, landmarks in rows]
+    rows = []
+    for dataset, excel_path in (excel_paths or {}).items():
+        if os.path.isfile(excel_path):
+            rows.extend((dataset, str(individual), knee, sequence, landmarks) for individual, knee, sequence, landmarks in read_excel(excel_path))
+    return rows
+
+_store = None
+_store_lock = threading.Lock()
+
+# Landmark store of the session, opened once
+def get_landmark_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = LandmarkStore()
+        return _store
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Exports the landmark store to the DATASET_*.xlsx workbooks, or imports them.')
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('--dataset', choices=sorted(EXCEL_PATHS), default=None, help='only this dataset (default: all)')
+    args = parser.parse_args()
+    store = LandmarkStore(excel_paths=None)
+    for dataset in [args.dataset] if args.dataset else sorted(EXCEL_PATHS):
+        excel_path = EXCEL_PATHS[dataset]
+        if args.action == 'import':
+            if not os.path.isfile(excel_path):
+                print(f'|-> Skipped {dataset}, {excel_path} does not exist |')
+                continue
+            print(f'|-> Imported {store.import_excel(dataset, excel_path)} rows from {excel_path} into {store.db_path} |')
+        else:
+            print(f'|-> Exported {store.export_excel(dataset, excel_path)} rows from {store.db_path} to {excel_path} |')
+    store.close()
@@ -0,0 +1,181 @@
+import json
+import time
+import atexit
+import argparse
+import threading
+import functools
+from datetime import datetime
+from config import PERF_TRACE, PERF_LOG
+
+'''
+    Named timing spans of the hot paths: sequence loading, slice updates, landmark saves, tree building, status I/O and VTK renders.
+    With PERF_TRACE=1 every span adds its duration to a histogram of its name, and at exit the session report (count, total,
+    mean, min, max, p50/p95/p99 and the histogram per span) is appended as one JSON line to PERF_LOG and printed.
+    Disabled, span() hands out a shared no-op context manager and timed() returns the function undecorated.
+        with span('DICOMImage.decode'): ...
+        @timed()
+        def load_dicom(self): ...
+    Reports of the last sessions of a log:
+        python perfTrace.py [--log perf_log.jsonl] [--sessions N]
+'''
+
+# histogram upper bounds in milliseconds, the last bucket holds everything slower
+BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+class SpanStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.counts = [0] * (len(BUCKETS) + 1)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        self.min = min(self.min, duration)
+        self.max = max(self.max, duration)
+        # buckets are few, a linear walk is as fast as a bisect here
+        bucket = 0
+        while bucket < len(BUCKETS) and duration > BUCKETS[bucket]:
+            bucket += 1
+        self.counts[bucket] += 1
+
+    # upper bound of the bucket holding the given fraction of the spans, never above the slowest span
+    def percentile(self, fraction):
+        target = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= target and count:
+                return min(BUCKETS[bucket], self.max) if bucket < len(BUCKETS) else self.max
+        return self.max
+
+    def report(self):
+        return {
+            "Count": self.count,
+            "Total": self.total,
+            "Mean": self.total / self.count,
+            "Min": self.min,
+            "Max": self.max,
+            "P50": self.percentile(0.5),
+            "P95": self.percentile(0.95),
+            "P99": self.percentile(0.99),
+            # "<=bound": count, empty buckets left out
+            "Histogram": {(f"<={BUCKETS[bucket]}" if bucket < len(BUCKETS) else f">{BUCKETS[-1]}"): count
+                          for bucket, count in enumerate(self.counts) if count}
+        }
+
+class Tracer:
+    def __init__(self, enabled=PERF_TRACE, log_file=PERF_LOG):
+        self.enabled = enabled
+        self.log_file = log_file
+        self.stats = {}
+        # spans also end on the save queue, prefetch and decode threads
+        self.lock = threading.Lock()
+        self.started = datetime.now()
+        if enabled:
+            atexit.register(self.dump)
+
+    def record(self, name, duration):
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = SpanStats()
+            stats.add(duration)
+
+    def report(self):
+        with self.lock:
+            return {name: self.stats[name].report() for name in sorted(self.stats)}
+
+    # Appends the session report to the log and prints it, nothing when no span ended
+    def dump(self):
+        spans = self.report()
+        if not spans:
+            return
+        session = {
+            "Session": self.started.isoformat(timespec='seconds'),
+            "Duration": (datetime.now() - self.started).total_seconds(),
+            "Spans": spans
+        }
+        try:
+            with open(self.log_file, 'a') as f:
+                f.write(json.dumps(session) + '\n')
+            print(f'|-> Performance report appended to {self.log_file} |')
+        except Exception as e:
+            print(f"Failed to write performance report to {self.log_file} due to: {e}")
+        print_session(session)
+
+class Span:
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, (time.perf_counter() - self.start) * 1000)
+        return False
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SPAN = NullSpan()
+
+tracer = Tracer()
+
+def span(name):
+    if not tracer.enabled:
+        return NULL_SPAN
+    return Span(tracer, name)
+
+# Decorator timing every call of a function, as name or its qualified name (DICOMImage.load_dicom)
+def timed(name=None):
+    def decorate(func):
+        if not tracer.enabled:
+            return func
+        span_name = name or func.__qualname__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tracer.record(span_name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorate
+
+# Times every Render() of a VTK render window, whoever calls it, from its StartEvent/EndEvent
+def trace_renders(render_window, name='vtk.render'):
+    if not tracer.enabled:
+        return
+    starts = []
+    render_window.AddObserver('StartEvent', lambda obj, event: starts.append(time.perf_counter()))
+    def on_end(obj, event):
+        if starts:
+            tracer.record(name, (time.perf_counter() - starts.pop()) * 1000)
+    render_window.AddObserver('EndEvent', on_end)
+
+def print_session(session):
+    print(f'-- Performance report of the session started {session["Session"]} ({session["Duration"]:.0f}s) --')
+    print(f'{"Span":<42}{"Count":>8}{"Total ms":>12}{"Mean":>10}{"P50":>10}{"P95":>10}{"Max":>10}')
+    for name, stats in sorted(session["Spans"].items(), key=lambda item: -item[1]["Total"]):
+        print(f'{name:<42}{stats["Count"]:>8}{stats["Total"]:>12.1f}{stats["Mean"]:>10.2f}{stats["P50"]:>10.2f}{stats["P95"]:>10.2f}{stats["Max"]:>10.2f}')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Prints the performance reports of the last sessions.')
+    parser.add_argument('--log', default=PERF_LOG)
+    parser.add_argument('--sessions', type=int, default=1)
+    args = parser.parse_args()
+    with open(args.log, 'r') as f:
+        sessions = [json.loads(line) for line in f if line.strip()]
+    for session in sessions[-args.sessions:]:
+        print_session(session)
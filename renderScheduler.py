@@ -0,0 +1,99 @@
+import time
+from collections import deque
+from PyQt5.QtCore import QObject, QTimer
+from config import FRAME_INTERVAL_MS
+
+'''
+    Coalesced rendering: interaction handlers change the camera (or anything else on screen) and only ask for a frame.
+    Requests mark the view dirty and arm a single-shot timer, the frame is drawn once when it fires, at most one frame
+    every FRAME_INTERVAL_MS. Events arriving faster than frames can be drawn (high rate mice, remote desktops) pile up
+    into the next frame instead of each waiting for its own Render(), so the view keeps up with the cursor.
+    Changes that are costly to apply (a slice switch) can be deferred to the frame with before_frame(), only the latest state is applied.
+    Frame times and request counts are kept for tuning, see stats().
+'''
+
+# frames kept for the recent frame time statistics
+RECENT_FRAMES = 240
+
+class RenderScheduler(QObject):
+    def __init__(self, render_window, renderer=None, interval=FRAME_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.render_window = render_window
+        self.renderer = renderer
+        self.interval = interval
+        self.dirty = False
+        self.reset_clipping = False
+        self.last_frame = 0.0
+        self.callbacks = []
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.frame)
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.requests = 0
+        self.frames = 0
+        self.frame_total = 0.0
+        self.frame_max = 0.0
+        self.recent = deque(maxlen=RECENT_FRAMES) # frame times in ms
+
+    # Asks for a frame, reset_clipping recomputes the camera clipping range right before it is drawn
+    def request(self, reset_clipping=False):
+        self.requests += 1
+        self.dirty = True
+        self.reset_clipping = self.reset_clipping or reset_clipping
+        if not self.timer.isActive():
+            # right after the pending events when the last frame is old enough, otherwise when the interval is over
+            elapsed = (time.perf_counter() - self.last_frame) * 1000
+            self.timer.start(int(max(0, self.interval - elapsed)))
+
+    # Runs callback() right before the next frame is drawn, once however often it is asked for
+    def before_frame(self, callback):
+        if callback not in self.callbacks:
+            self.callbacks.append(callback)
+        self.request()
+
+    # Draws now, pending requests included
+    def render_now(self, reset_clipping=False):
+        self.timer.stop()
+        self.dirty = True
+        self.reset_clipping = self.reset_clipping or reset_clipping
+        self.frame()
+
+    def frame(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        callbacks, self.callbacks = self.callbacks, []
+        for callback in callbacks:
+            callback()
+        if self.reset_clipping and self.renderer is not None:
+            self.renderer.ResetCameraClippingRange()
+        self.reset_clipping = False
+        start = time.perf_counter()
+        self.render_window.Render()
+        self.last_frame = time.perf_counter()
+        frame_time = (self.last_frame - start) * 1000
+        self.frames += 1
+        self.frame_total += frame_time
+        self.frame_max = max(self.frame_max, frame_time)
+        self.recent.append(frame_time)
+
+    # Frame time statistics in ms, coalesced counts the requests drawn by a frame asked for by another one
+    def stats(self):
+        recent = sorted(self.recent)
+        return {
+            "Requests": self.requests,
+            "Frames": self.frames,
+            "Coalesced": max(0, self.requests - self.frames),
+            "Mean": self.frame_total / self.frames if self.frames else 0.0,
+            "Max": self.frame_max,
+            "RecentP50": recent[len(recent) // 2] if recent else 0.0,
+            "RecentP95": recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0,
+            "Interval": self.interval
+        }
+
+    def summary(self):
+        stats = self.stats()
+        return (f'{stats["Frames"]} frames for {stats["Requests"]} requests ({stats["Coalesced"]} coalesced), '
+                f'frame time mean {stats["Mean"]:.1f} ms, p95 {stats["RecentP95"]:.1f} ms, max {stats["Max"]:.1f} ms')
@@ -0,0 +1,84 @@
+import atexit
+import threading
+import traceback
+from collections import OrderedDict
+from statusStore import normalize_path
+
+'''
+    Write-behind queue for the landmark saves: jobs run one at a time on a background writer thread, so the Qt thread
+    never waits on the disk. Jobs are keyed by sequence, a job submitted while an older one of the same sequence is
+    still pending replaces it (only the last state of a sequence has to reach the disk). Keys are compared in their
+    statusStore.normalize_path form, the callbacks get the key as it was submitted.
+    on_finished(key, result) and on_failed(key, message) are called from the writer thread, the GUI passes
+    SignalHandler emits so the results are delivered on the Qt thread. Pending jobs are flushed at exit.
+'''
+
+class SaveQueue:
+    def __init__(self, on_finished=None, on_failed=None):
+        self.on_finished = on_finished
+        self.on_failed = on_failed
+        self.pending = OrderedDict()
+        self.active = None
+        self.stopped = False
+        self.written = 0
+        self.coalesced = 0
+        self.condition = threading.Condition()
+        # daemon so a stuck disk cannot keep the process alive, close() at exit writes what is left
+        self.thread = threading.Thread(target=self.run, name='SaveQueue', daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    # Queues job() for a sequence, returns False once the queue is closed
+    def submit(self, key, job):
+        with self.condition:
+            if self.stopped:
+                return False
+            if self.pending.pop(normalize_path(key), None) is not None:
+                self.coalesced += 1
+            self.pending[normalize_path(key)] = (key, job)
+            self.condition.notify_all()
+            return True
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopped:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                self.active, (key, job) = self.pending.popitem(last=False)
+            try:
+                result = job()
+                callback, args = self.on_finished, (key, result)
+            except Exception as e:
+                traceback.print_exc()
+                callback, args = self.on_failed, (key, str(e))
+            # reported before the job counts as flushed
+            if callback is not None:
+                try:
+                    callback(*args)
+                except Exception as e:
+                    # the receiver may already be gone at exit
+                    print(f"Failed to report save of {key} due to: {e}")
+            with self.condition:
+                self.written += 1
+                self.active = None
+                self.condition.notify_all()
+
+    # Waits until the jobs of a sequence (or all jobs) are written, False on timeout
+    def flush(self, key=None, timeout=None):
+        with self.condition:
+            if key is None:
+                return self.condition.wait_for(lambda: not self.pending and self.active is None, timeout)
+            key = normalize_path(key)
+            return self.condition.wait_for(lambda: key not in self.pending and self.active != key, timeout)
+
+    # Writes the pending jobs and stops the writer, safe to call more than once
+    def close(self):
+        with self.condition:
+            if self.stopped:
+                return
+            self.stopped = True
+            self.condition.notify_all()
+        self.thread.join()
+        print(f'|-> Save queue closed: {self.written} writes, {self.coalesced} coalesced |')
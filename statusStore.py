@@ -0,0 +1,251 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+from urllib.request import pathname2url
+from config import STATUS_FILE, STATUS_DB
+from perfTrace import timed
+
+'''
+    Labeling status of every sequence (0 = to label, 1 = labeled) kept in SQLite instead of status.json.
+    Each update is a single row change committed atomically (WAL journal), so a crash mid-write cannot corrupt the store
+    and a click no longer parses and rewrites the whole file. Rows keep the order of status.json through their position.
+    A new store imports STATUS_FILE, and the status.json format can be imported/exported at any time:
+        python statusStore.py import [status.json]
+        python statusStore.py export [status.json]
+'''
+
+# Lookup form of a sequence path, status.json keys mix separators (D:/DataOrtho/DATASET_AXIAL\\94\\RIGHT\\seq)
+# while the tree builds D:/DataOrtho/DATASET_AXIAL/94/RIGHT/seq
+def normalize_path(path):
+    return os.path.normcase(os.path.normpath(path.replace('\\', '/')))
+
+class StatusStore:
+    def __init__(self, db_path=STATUS_DB, status_file=STATUS_FILE):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS status (path TEXT PRIMARY KEY, status INTEGER NOT NULL, position INTEGER NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS status_position ON status (position)')
+            self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)')
+        # status.json is imported once, a store emptied by removals must not get the old statuses back
+        if self.get_meta('StatusFileImported') is None:
+            if not self.count() and status_file and os.path.isfile(status_file):
+                imported = self.import_json(status_file)
+                print(f'|-> Imported {imported} sequence status from {status_file} into {db_path} |')
+            self.set_meta('StatusFileImported', '1')
+
+    def get_meta(self, key):
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key, value):
+        with self.connection:
+            self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def count(self):
+        return self.connection.execute('SELECT COUNT(*) FROM status').fetchone()[0]
+
+    def get(self, path, default=None):
+        row = self.connection.execute('SELECT status FROM status WHERE path = ?', (path,)).fetchone()
+        return row[0] if row is not None else default
+
+    def __contains__(self, path):
+        return self.connection.execute('SELECT 1 FROM status WHERE path = ?', (path,)).fetchone() is not None
+
+    # Point update, new paths go to the end of the order
+    @timed()
+    def set(self, path, status):
+        with self.connection:
+            self._set(path, status)
+
+    def _set(self, path, status):
+        if self.connection.execute('UPDATE status SET status = ? WHERE path = ?', (int(status), path)).rowcount == 0:
+            self.connection.execute('INSERT INTO status (path, status, position) VALUES (?, ?, (SELECT COALESCE(MAX(position), -1) + 1 FROM status))', (path, int(status)))
+
+    @timed()
+    def remove(self, path):
+        with self.connection:
+            self.connection.execute('DELETE FROM status WHERE path = ?', (path,))
+
+    # (path, status) pairs in status.json order
+    @timed()
+    def items(self):
+        return self.connection.execute('SELECT path, status FROM status ORDER BY position').fetchall()
+
+    def paths(self):
+        return [path for path, _ in self.items()]
+
+    # First sequence in order with the given status, None if there is none
+    def first_with_status(self, status):
+        row = self.connection.execute('SELECT path FROM status WHERE status = ? ORDER BY position LIMIT 1', (int(status),)).fetchone()
+        return row[0] if row is not None else None
+
+    def first_path(self):
+        row = self.connection.execute('SELECT path FROM status ORDER BY position LIMIT 1').fetchone()
+        return row[0] if row is not None else None
+
+    # Adds the given paths with a status in one transaction, paths already in the store keep theirs. Returns the number added
+    @timed()
+    def add_missing(self, paths, status=0):
+        added = 0
+        with self.connection:
+            for path in paths:
+                if path not in self:
+                    self._set(path, status)
+                    added += 1
+        return added
+
+    # Merges a status.json file in one transaction, returns the number of entries read
+    def import_json(self, status_file):
+        with open(status_file, 'r') as f:
+            status_dict = json.load(f)
+        with self.connection:
+            for path, status in status_dict.items():
+                self._set(path, status)
+        return len(status_dict)
+
+    # Writes the store in the status.json format, through a temporary file
+    def export_json(self, status_file):
+        status_dict = dict(self.items())
+        tmp_file = status_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(status_dict, f, indent=4)
+        os.replace(tmp_file, status_file)
+        return len(status_dict)
+
+    # Changes whenever another connection (another process or window) commits to the store
+    def data_version(self):
+        return self.connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+# Stored (path, status) pairs in order without creating or writing anything: the store opened read-only, or when there
+# is no store yet the status.json a new store would import
+def read_items(db_path=STATUS_DB, status_file=STATUS_FILE):
+    if os.path.isfile(db_path):
+        connection = sqlite3.connect(f'file:{pathname2url(os.path.abspath(db_path))}?mode=ro', uri=True)
+        try:
+            return connection.execute('SELECT path, status FROM status ORDER BY position').fetchall()
+        finally:
+            connection.close()
+    if status_file and os.path.isfile(status_file):
+        with open(status_file, 'r') as f:
+            return [(path, int(status)) for path, status in json.load(f).items()]
+    return []
+
+def read_paths(db_path=STATUS_DB, status_file=STATUS_FILE):
+    return [path for path, _ in read_items(db_path, status_file)]
+
+'''
+    Status of the session held in memory under normalized path keys, loaded once from the store.
+    Reads never touch the store, writes go through to it. Commits from other connections are picked up
+    by polling the store's data_version, at most once every REFRESH_INTERVAL seconds.
+    Listeners are called with (path, status) on every change, status None for a removal and (None, None) after a reload.
+'''
+class StatusService:
+    REFRESH_INTERVAL = 1.0
+
+    def __init__(self, store):
+        self.store = store
+        self.listeners = []
+        self.reload()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, path, status):
+        for listener in self.listeners:
+            listener(path, status)
+
+    @timed()
+    def reload(self):
+        self.status = {}
+        self.stored_paths = {}
+        self.order = []
+        for path, status in self.store.items():
+            key = normalize_path(path)
+            if key not in self.status:
+                self.order.append(key)
+            self.status[key] = status
+            self.stored_paths[key] = path
+        self.version = self.store.data_version()
+        self.checked = time.monotonic()
+        self.notify(None, None)
+
+    # reloads when somebody else committed since the last check
+    def refresh(self):
+        now = time.monotonic()
+        if now - self.checked < self.REFRESH_INTERVAL:
+            return
+        self.checked = now
+        if self.store.data_version() != self.version:
+            print('|-> Status store changed externally, reloading |')
+            self.reload()
+
+    def get(self, path, default=None):
+        self.refresh()
+        return self.status.get(normalize_path(path), default)
+
+    def __contains__(self, path):
+        self.refresh()
+        return normalize_path(path) in self.status
+
+    # the path as written in the store, so updates hit the existing row whatever separators the caller used
+    def stored_path(self, path):
+        return self.stored_paths.get(normalize_path(path), path)
+
+    def set(self, path, status):
+        key = normalize_path(path)
+        self.store.set(self.stored_path(path), status)
+        if key not in self.status:
+            self.order.append(key)
+            self.stored_paths[key] = path
+        self.status[key] = int(status)
+        self.notify(path, int(status))
+
+    def remove(self, path):
+        key = normalize_path(path)
+        self.store.remove(self.stored_path(path))
+        if key in self.status:
+            del self.status[key]
+            del self.stored_paths[key]
+            self.order.remove(key)
+            self.notify(path, None)
+
+    # stored paths in status.json order
+    def paths(self):
+        self.refresh()
+        return [self.stored_paths[key] for key in self.order]
+
+    # position of a path in paths(), None when it is unknown
+    def position(self, path):
+        key = normalize_path(path)
+        return self.order.index(key) if key in self.status else None
+
+    def first_with_status(self, status):
+        self.refresh()
+        for key in self.order:
+            if self.status[key] == status:
+                return self.stored_paths[key]
+        return None
+
+    def first_path(self):
+        self.refresh()
+        return self.stored_paths[self.order[0]] if self.order else None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Imports or exports the status store in the status.json format.')
+    parser.add_argument('action', choices=['import', 'export'])
+    parser.add_argument('status_file', nargs='?', default=STATUS_FILE)
+    args = parser.parse_args()
+    store = StatusStore(status_file=None)
+    if args.action == 'import':
+        print(f'|-> Imported {store.import_json(args.status_file)} entries from {args.status_file} into {store.db_path} |')
+    else:
+        print(f'|-> Exported {store.export_json(args.status_file)} entries from {store.db_path} to {args.status_file} |')
+    store.close()
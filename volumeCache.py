@@ -0,0 +1,96 @@
+import os
+import threading
+from collections import OrderedDict
+from config import VOLUME_CACHE_MB
+
+'''
+    Process wide LRU cache of decoded sequence volumes, so reopening a recent sequence skips the decode.
+    Entries are keyed by the sequence directory plus name, size and mtime of its .dcm files, a changed file
+    gives a new key and the stale entry simply ages out. The cache is bounded by VOLUME_CACHE_MB.
+'''
+
+# Key that identifies the content of a sequence directory
+def sequence_key(dicom_dir, dicom_paths):
+    files = []
+    for dicom_path in dicom_paths:
+        stat = os.stat(dicom_path)
+        files.append((os.path.basename(dicom_path), stat.st_size, stat.st_mtime_ns))
+    return (os.path.normcase(os.path.normpath(dicom_dir)), tuple(files))
+
+class CachedVolume:
+    def __init__(self, volume, dicom_paths):
+        self.volume = volume # (slice, row, column) array, read-only once cached
+        self.dicom_paths = dicom_paths # paths that made it into the volume, unreadable first files excluded
+        self.nbytes = volume.nbytes
+
+class VolumeCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # the streaming loader stores volumes from its own thread
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    # membership test that leaves the LRU order and the hit/miss counters alone
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def put(self, key, volume, dicom_paths):
+        entry = CachedVolume(volume, list(dicom_paths))
+        if entry.nbytes > self.max_bytes:
+            return
+        # volumes are shared between DICOMImage instances and vtkImageData, nobody may write them anymore
+        volume.setflags(write=False)
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key).nbytes
+            self.entries[key] = entry
+            self.nbytes += entry.nbytes
+            # least recently used volumes go first
+            while self.nbytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+                self.evictions += 1
+
+    def discard(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.nbytes -= entry.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "Entries": len(self.entries),
+                "Bytes": self.nbytes,
+                "MaxBytes": self.max_bytes,
+                "Hits": self.hits,
+                "Misses": self.misses,
+                "Evictions": self.evictions
+            }
+
+    def summary(self):
+        stats = self.stats()
+        return (f'{stats["Hits"]} hits, {stats["Misses"]} misses, {stats["Evictions"]} evictions, '
+                f'{stats["Entries"]} volumes in {stats["Bytes"] / 2**20:.1f} of {stats["MaxBytes"] / 2**20:.0f} MB')
+
+volume_cache = VolumeCache(VOLUME_CACHE_MB * 1024 * 1024)
@@ -0,0 +1,87 @@
+import os
+import json
+import struct
+import hashlib
+import numpy as np
+from config import BASE_DIR, VOLUME_STORE_DIR
+
+'''
+    Persistent store of normalized sequence volumes, one packed file per sequence:
+        8 bytes magic | 4 bytes little-endian header length | JSON header | zero padding up to HEADER_SIZE | raw C-order voxels
+    Loads memory-map the voxels, so a sequence costs one contiguous read instead of dozens of small DICOM files.
+    The header carries a fingerprint of the source .dcm files (name, size, mtime), a changed source invalidates the file.
+    Files live inside the sequence directory, or under VOLUME_STORE_DIR mirroring the layout below BASE_DIR.
+'''
+
+MAGIC = b'ILGVOL01'
+HEADER_SIZE = 4096
+VOLUME_EXTENSION = '.vol'
+
+# Fingerprint of the source files of a sequence, files as given by volumeCache.sequence_key
+def fingerprint(files):
+    return hashlib.sha1(repr(tuple(files)).encode('utf-8')).hexdigest()
+
+# Where the packed volume of a sequence directory is kept
+def volume_path(dicom_dir, store_dir=VOLUME_STORE_DIR):
+    dicom_dir = os.path.normpath(dicom_dir)
+    name = os.path.basename(dicom_dir) + VOLUME_EXTENSION
+    if store_dir:
+        relative = os.path.relpath(dicom_dir, BASE_DIR) if os.path.splitdrive(dicom_dir)[0] == os.path.splitdrive(BASE_DIR)[0] else ''
+        if relative and not relative.startswith(os.pardir):
+            return os.path.join(store_dir, os.path.dirname(relative), name)
+    return os.path.join(dicom_dir, name)
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + 4)
+        if len(prefix) != len(MAGIC) + 4 or prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a packed volume file")
+        length = struct.unpack('<I', prefix[len(MAGIC):])[0]
+        return json.loads(f.read(length).decode('utf-8'))
+
+# Writes to a temporary file first so an interrupted write never leaves a truncated volume behind
+def write_volume(path, volume, header):
+    volume = np.ascontiguousarray(volume)
+    header = dict(header, Dtype=volume.dtype.str, Shape=list(volume.shape))
+    encoded = json.dumps(header).encode('utf-8')
+    if len(MAGIC) + 4 + len(encoded) > HEADER_SIZE:
+        raise ValueError(f"Header of {path} does not fit in {HEADER_SIZE} bytes")
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC + struct.pack('<I', len(encoded)) + encoded)
+        f.write(b'\0' * (HEADER_SIZE - len(MAGIC) - 4 - len(encoded)))
+        f.write(volume.tobytes())
+    os.replace(tmp_path, path)
+
+# Memory-maps the voxels of a packed volume file, returns (header, volume)
+def open_volume(path):
+    header = read_header(path)
+    volume = np.memmap(path, dtype=np.dtype(header['Dtype']), mode='r', offset=HEADER_SIZE, shape=tuple(header['Shape']))
+    return header, volume
+
+# The packed volume of a sequence when it exists and still matches its sources, otherwise None
+def load_volume(dicom_dir, files, mode):
+    path = volume_path(dicom_dir)
+    if not os.path.isfile(path):
+        return None
+    try:
+        header = read_header(path)
+        if header.get('Fingerprint') != fingerprint(files) or header.get('Mode') != mode:
+            print(f'|-> Stale packed volume ignored: {path} |')
+            return None
+        return open_volume(path)
+    except Exception as e:
+        print(f"Error reading packed volume {path}: {str(e)}")
+        return None
+
+def save_volume(dicom_dir, files, mode, volume, dicom_paths):
+    header = {
+        "Fingerprint": fingerprint(files),
+        "Mode": mode,
+        "Files": [os.path.basename(dicom_path) for dicom_path in dicom_paths]
+    }
+    path = volume_path(dicom_dir)
+    # only the mirror below VOLUME_STORE_DIR is created, a sequence directory removed meanwhile must stay removed
+    if os.path.dirname(path) != os.path.normpath(dicom_dir):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_volume(path, volume, header)
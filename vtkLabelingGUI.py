@@ -1,14 +1,14 @@
 from PyQt5 import QtCore
-from PyQt5.QtGui import QStandardItem, QCursor, QStandardItemModel, QImageReader, QPixmap
-from PyQt5.QtCore import Qt, QDir, QFileInfo, pyqtSignal, QObject
+from PyQt5.QtGui import QCursor
+from PyQt5.QtCore import Qt, pyqtSignal, QObject
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QDockWidget,
         QHBoxLayout, QVBoxLayout, QSlider, QPushButton, QMessageBox,
         QFrame, QLabel, QComboBox, QTextEdit, QTreeView, QAbstractItemView, QListWidget)
 import re
-import json
 import os
 import sys
 import shutil
+import threading
 import vtk.util.numpy_support as nps
 import numpy as np
 from pathlib import Path
@@ -16,15 +16,23 @@ import vtk
 from vtk.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 from styles import (button_style, combo_style,frame_number_style,coordinates_box_style, title_style, tree_view_style,scrollbar_css, buttonState_style, 
     label_style, buttonReset_Style, buttonToggle_style, message_box_style)
-from dicomProcessing import DICOMImage, Landmark
-from config import BASE_DIR, STATUS_FILE, HELP_PATH, EXCEL_PATHS
+from dicomProcessing import DICOMImage, Landmark, prefetch_volume
+from volumeCache import volume_cache
+from config import BASE_DIR, STATUS_FILE, HELP_PATH, EXCEL_PATHS, MAX_LANDMARKS
+from statusStore import StatusStore, StatusService, normalize_path
+from saveQueue import SaveQueue
+from datasetTreeModel import DatasetTreeModel
+from workQueue import WorkQueue, subset_of
+from helpImageCache import HelpImageCache, help_key
+from perfTrace import timed, trace_renders
+from renderScheduler import RenderScheduler
 ''' -------------------  Global Vars -------------------'''
 base_dir= BASE_DIR
 status_file = STATUS_FILE
 help_path = HELP_PATH
 excel_paths = EXCEL_PATHS
 
-max_landmarks = {'DATASET_AXIAL':11,'DATASET_SAGITTAL':7,'DATASET_DYNAMIC':18} 
+max_landmarks = MAX_LANDMARKS
 
 # SignalHandler class for Landmarks handling
 class SignalHandler(QObject):
@@ -34,12 +42,17 @@ class SignalHandler(QObject):
     clearLandmarks = pyqtSignal()
     nextSlice = pyqtSignal()
     previousSlice = pyqtSignal()
+    # results of the save queue: (sequence path, new status) and (sequence path, error)
+    saveFinished = pyqtSignal(str, int)
+    saveFailed = pyqtSignal(str, str)
 
 ''' Custom interactor Style class for VTK window  '''
 
 class CustomInteractorStyle(vtk.vtkInteractorStyleUser):
-    def __init__(self,signalHandler,renderer,image_width,image_height,current_image,landmark_count,max_count,point_counter_label,parent=None):
+    def __init__(self,signalHandler,renderer,image_width,image_height,current_image,landmark_count,max_count,point_counter_label,render_scheduler=None,parent=None):
         self.signalHandler = signalHandler
+        # camera changes are drawn once per frame by the scheduler
+        self.render_scheduler = render_scheduler
         self.AddObserver("MouseMoveEvent",self.mouse_move) 
         self.AddObserver("LeftButtonPressEvent",self.OnLeftButtonDown)
         self.AddObserver("RightButtonPressEvent",self.OnRightButtonDown)
@@ -97,8 +110,7 @@ class CustomInteractorStyle(vtk.vtkInteractorStyleUser):
     
             camera.SetPosition(cameraPos[0] + dx * zoomFactor, cameraPos[1] - dy * zoomFactor, cameraPos[2])
             camera.SetFocalPoint(focalPos[0] + dx * zoomFactor, focalPos[1] - dy * zoomFactor, focalPos[2])
-            self.ren.ResetCameraClippingRange() 
-            self.ren.GetRenderWindow().Render()
+            self.request_render()
     
     def OnLeftButtonDown(self,obj,event):
         shift_key = self.GetInteractor().GetShiftKey()
@@ -138,8 +150,7 @@ class CustomInteractorStyle(vtk.vtkInteractorStyleUser):
         if shift_key:    
             camera= self.ren.GetActiveCamera()
             camera.Dolly(1.1)
-            self.ren.ResetCameraClippingRange()
-            self.ren.GetRenderWindow().Render()
+            self.request_render()
         else:
             self.signalHandler.nextSlice.emit()
     
@@ -148,19 +159,30 @@ class CustomInteractorStyle(vtk.vtkInteractorStyleUser):
         if shift_key: 
             camera = self.ren.GetActiveCamera()
             camera.Dolly(0.9)  # Zoom out
-            self.ren.ResetCameraClippingRange()
-            self.ren.GetRenderWindow().Render()
+            self.request_render()
         else:
             self.signalHandler.previousSlice.emit()
         
+    # Camera moved: the frame is drawn by the render scheduler, with every other camera change until then
+    def request_render(self):
+        if self.render_scheduler is not None:
+            self.render_scheduler.request(reset_clipping=True)
+        else:
+            self.ren.ResetCameraClippingRange()
+            self.ren.GetRenderWindow().Render()
+
     # Reseting the camera to its original values, position and focal point   
     def reset_camera(self):
         # Reset the camera to its initial parameters
         self.ren.GetActiveCamera().SetPosition(self.init_camera_pos)
         self.ren.GetActiveCamera().SetFocalPoint(self.init_camera_focal_point)
         self.ren.GetActiveCamera().SetViewUp(self.init_camera_view_up)
-        self.ren.ResetCameraClippingRange()
-        self.ren.GetRenderWindow().Render()
+        if self.render_scheduler is not None:
+            # pending pan/zoom frames are superseded by this one
+            self.render_scheduler.render_now(reset_clipping=True)
+        else:
+            self.ren.ResetCameraClippingRange()
+            self.ren.GetRenderWindow().Render()
         
     def reset_landmark_count(self):
         print(f'- Removed {self.landmark_count} landmarks !')
@@ -177,12 +199,24 @@ class LabelingGUIWindow(QMainWindow):
         self.vtkWidget = QVTKRenderWindowInteractor(self.frameWidget)  
         
         ''' -------------  Variables of state -------------'''
-        # First Current path is decided by current state - read of json 
+        # Labeling status of every sequence, imported from status.json on first use and read once into memory
+        self.status_store = StatusService(StatusStore())
+        # sequences still to label, follows every status change
+        self.work_queue = WorkQueue(self.status_store)
+        # stops the background decode of the upcoming sequence
+        self.prefetch_stop = threading.Event()
+        self.prefetch_path = None
+        self.prefetch_thread = None
+        # First Current path is decided by current state - read of the status store
         self.current_sequence_path, self.current_subset_path = self.getCurrentSequence()
             
         #Current help index
         self.help_image_index = 0
         self.help_images = []
+        # help images of every subset/knee decoded and scaled once in the background
+        self.help_cache = HelpImageCache(help_path)
+        self.help_cache.preload()
+        self.help_key = None
         ''' -------------  GUI COMPONENTS -------------'''
         self.title_label = QLabel(self)
         self.title_label.setText("ImageLabelingGUI")
@@ -217,6 +251,8 @@ class LabelingGUIWindow(QMainWindow):
         ''' -------------  IMAGE LOADING and HANDLING -------------'''
         self.ren = vtk.vtkRenderer()
         self.vtkWidget.GetRenderWindow().AddRenderer(self.ren)
+        # every render is timed when PERF_TRACE is on, whichever handler asked for it
+        trace_renders(self.vtkWidget.GetRenderWindow())
         self.current_image = DICOMImage(self.current_sequence_path,self.ren)
         image_width = self.current_image.width
         image_height = self.current_image.height
@@ -228,15 +264,22 @@ class LabelingGUIWindow(QMainWindow):
         camera.SetViewUp(0, -1, 0)
         self.ren.ResetCamera()
         self.signalHandler = SignalHandler()
+        # landmark writes happen on a background writer, results come back as signals on the Qt thread
+        self.save_queue = SaveQueue(self.signalHandler.saveFinished.emit, self.signalHandler.saveFailed.emit)
+        self.signalHandler.saveFinished.connect(self.on_save_finished)
+        self.signalHandler.saveFailed.connect(self.on_save_failed)
         self.signalHandler.landmarkAdded.connect(self.next_help_image)
         self.signalHandler.landmarkRemoved.connect(self.prev_help_image)
         self.signalHandler.landmarkRemoved.connect(self.remove_last_landmark_box)
         self.signalHandler.writeLandmark.connect(self.add_landmark_box)
-        self.signalHandler.nextSlice.connect(self.next_image)
-        self.signalHandler.previousSlice.connect(self.prev_image)
+        # wheel ticks only move the target slice, it is shown once per frame
+        self.signalHandler.nextSlice.connect(self.scroll_next)
+        self.signalHandler.previousSlice.connect(self.scroll_prev)
         self.interactor = self.vtkWidget.GetRenderWindow().GetInteractor()
+        # pan and zoom events are coalesced into at most one render per display frame
+        self.render_scheduler = RenderScheduler(self.vtkWidget.GetRenderWindow(), self.ren, parent=self)
         self.interactorStyle = CustomInteractorStyle(self.signalHandler,self.current_image.ren,image_width,image_height, 
-                                                     self.current_image,0,self.max_count,self.point_counter_label)
+                                                     self.current_image,0,self.max_count,self.point_counter_label,self.render_scheduler)
         self.interactor.SetInteractorStyle(self.interactorStyle)
         
         ''' ------------  GUI OPERATERS -------------'''
@@ -247,21 +290,16 @@ class LabelingGUIWindow(QMainWindow):
         levelSlider_label.setStyleSheet(label_style)   
         self.windowSlider = QSlider(QtCore.Qt.Horizontal)
         self.levelSlider = QSlider(QtCore.Qt.Horizontal) 
-        self.windowSlider.setMinimum(0)
-        self.windowSlider.setMaximum(255)
-        self.levelSlider.setMinimum(0)
-        self.levelSlider.setMaximum(255)
         self.windowSlider.valueChanged.connect(self.update_window)
         self.levelSlider.valueChanged.connect(self.update_level)
         
-        # set up the initiall values of the sliders with the current values of the current_image
-        window = self.current_image.get_image_property().GetColorWindow()
-        level = self.current_image.get_image_property().GetColorLevel()
-        self.windowSlider.setValue(window)
-        self.levelSlider.setValue(level)
+        # set up the ranges and initiall values of the sliders with the current values of the current_image
+        self.configure_sliders()
         #indexes start with 0, with to treat the slices starting from 1
         self.slice = self.current_image.index+1
         self.slice_number.setText(str(self.slice))
+        # slice the wheel scrolled to, not shown yet
+        self.pending_slice = None
         
         #-- buttons --
         self.nextButton = QPushButton("Next",self)
@@ -270,6 +308,7 @@ class LabelingGUIWindow(QMainWindow):
         self.save_button = QPushButton('Save Coordinates', self)
         self.resetView_button = QPushButton("Reset View",self)
         self.removeSequence_button = QPushButton("Remove Current Sequence",self)
+        self.nextUnlabeled_button = QPushButton("Next Unlabeled",self)
         
         
         self.nextButton.setCursor(QCursor(Qt.PointingHandCursor))
@@ -278,6 +317,7 @@ class LabelingGUIWindow(QMainWindow):
         self.save_button.setCursor(QCursor(Qt.PointingHandCursor))
         self.resetView_button.setCursor(QCursor(Qt.PointingHandCursor))
         self.removeSequence_button.setCursor(QCursor(Qt.PointingHandCursor))
+        self.nextUnlabeled_button.setCursor(QCursor(Qt.PointingHandCursor))
         
         self.nextButton.setStyleSheet(button_style)
         self.prevButton.setStyleSheet(button_style)
@@ -285,6 +325,7 @@ class LabelingGUIWindow(QMainWindow):
         self.save_button.setStyleSheet(buttonState_style)
         self.resetView_button.setStyleSheet(buttonReset_Style)
         self.removeSequence_button.setStyleSheet(buttonReset_Style)
+        self.nextUnlabeled_button.setStyleSheet(buttonReset_Style)
         
         self.nextButton.clicked.connect(self.next_image)
         self.prevButton.clicked.connect(self.prev_image)
@@ -292,6 +333,7 @@ class LabelingGUIWindow(QMainWindow):
         self.save_button.clicked.connect(self.save_Landmarks)
         self.resetView_button.clicked.connect(self.reset_view)
         self.removeSequence_button.clicked.connect(self.remove_current_sequence)
+        self.nextUnlabeled_button.clicked.connect(self.next_unlabeled_sequence)
         
         #-- lines --
         line = QFrame(self)
@@ -314,14 +356,14 @@ class LabelingGUIWindow(QMainWindow):
         
         #-- Tree View --
         self.tree_view = QTreeView(self)
-        self.model = QStandardItemModel()
+        # individuals, knees and sequences are listed when expanded, statuses filled in the background
+        self.model = DatasetTreeModel(self.get_status_for_sequence)
         self.tree_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         self.tree_view.setModel(self.model)
         combined_css = tree_view_style + scrollbar_css
         self.tree_view.setStyleSheet(combined_css)       
         self.tree_view.clicked.connect(self.on_sequence_clicked)
-        self.model.setHorizontalHeaderLabels(['Folder','Status','Landmarks'])
-        self.add_folder_to_model(self.current_subset_path, self.model.invisibleRootItem(),0)
+        self.model.set_root(self.current_subset_path)
         
         #-- Read-only textlist for the display coordinates (help layout)-- 
         self.coordinates_box = QListWidget(self)
@@ -389,6 +431,7 @@ class LabelingGUIWindow(QMainWindow):
         self.image_Sublayout = QHBoxLayout()
         self.image_Sublayout.addWidget(self.resetView_button,alignment=Qt.AlignCenter)
         self.image_Sublayout.addWidget(self.removeSequence_button, alignment=Qt.AlignCenter)
+        self.image_Sublayout.addWidget(self.nextUnlabeled_button, alignment=Qt.AlignCenter)
         self.image_layout.addLayout(self.image_Sublayout)
         
         self.operate_widget = QWidget()
@@ -418,6 +461,9 @@ class LabelingGUIWindow(QMainWindow):
         self.toggle_dock_button.setStyleSheet(buttonToggle_style)
         self.toggle_dock_button.clicked.connect(self.toggle_operate_dock)
         
+        # the next sequence to label is decoded in the background
+        self.prefetch_next()
+        
         #-- Interactor Initialization--
         self.interactor.Initialize()
         self.interactor.Start()
@@ -476,6 +522,20 @@ class LabelingGUIWindow(QMainWindow):
         self.vtkWidget.GetRenderWindow().Render()
         
         
+    # slider ranges follow the voxel range of the image (0-255, or raw values in 16bit mode) and start on its window/level
+    def configure_sliders(self):
+        low, high = self.current_image.scalar_range
+        image_property = self.current_image.get_image_property()
+        # setting them must not render, the image property already holds these values
+        self.windowSlider.blockSignals(True)
+        self.levelSlider.blockSignals(True)
+        self.windowSlider.setRange(0, max(high - low, 1))
+        self.levelSlider.setRange(low, high)
+        self.windowSlider.setValue(int(image_property.GetColorWindow()))
+        self.levelSlider.setValue(int(image_property.GetColorLevel()))
+        self.windowSlider.blockSignals(False)
+        self.levelSlider.blockSignals(False)
+
     def create_slider_with_labels(self, slider,inverse):
         layout = QHBoxLayout()
 
@@ -500,67 +560,82 @@ class LabelingGUIWindow(QMainWindow):
 
     #---- Button handling ----
     # Next image
+    @QtCore.pyqtSlot()
+    @timed()
     def next_image(self):
-        if self.slice != self.current_image.max_slice:
-            self.slice+=1
-            self.current_image.next_image()
-            self.vtkWidget.GetRenderWindow().Render()
-            # Update interactor style
-            self.slice_number.setText(str(self.slice))
-            self.interactorStyle.image_width = self.current_image.width
-            self.interactorStyle.image_height = self.current_image.height
+        target = self.pending_slice or self.slice
+        if target < len(self.current_image.dicom_paths):
+            self.show_slice(target + 1)
+            self.render_scheduler.render_now()
     #Previous image
+    @QtCore.pyqtSlot()
+    @timed()
     def prev_image(self):
-        if self.slice != 1:
-            self.slice-=1
-            self.current_image.prev_image()  
-            self.vtkWidget.GetRenderWindow().Render()
-            self.slice_number.setText(str(self.slice))
-            # Update interactor style
-            self.interactorStyle.image_width = self.current_image.width
-            self.interactorStyle.image_height = self.current_image.height
+        target = self.pending_slice or self.slice
+        if target > 1:
+            self.show_slice(target - 1)
+            self.render_scheduler.render_now()
+
+    # Shows a slice (1-based), the image with its landmarks, the slice label and the interactor move together.
+    # The image clamps it to the slices its volume really has
+    @timed()
+    def show_slice(self, slice_number):
+        self.pending_slice = None
+        self.slice = self.current_image.set_index(slice_number - 1) + 1
+        self.slice_number.setText(str(self.slice))
+        # Update interactor style
+        self.interactorStyle.image_width = self.current_image.width
+        self.interactorStyle.image_height = self.current_image.height
+
+    # Wheel ticks add up to a target slice, only the latest target is shown when the next frame is drawn
+    def scroll_slice(self, step):
+        start = self.pending_slice or self.slice
+        target = min(max(start + step, 1), len(self.current_image.dicom_paths))
+        if target == start:
+            return
+        self.pending_slice = target
+        self.render_scheduler.before_frame(self.show_pending_slice)
+
+    def show_pending_slice(self):
+        # a sequence switch meanwhile drops the target
+        if self.pending_slice is not None:
+            self.show_slice(self.pending_slice)
+
+    def scroll_next(self):
+        self.scroll_slice(1)
+
+    def scroll_prev(self):
+        self.scroll_slice(-1)
     
     # Clear all Landmarks call     
+    @QtCore.pyqtSlot()
+    @timed()
     def clear_Landmarks(self):
         # DICOMImage function to clear all the landmarks
-        completed = self.current_image.clear_landmarks()
+        completed = self.current_image.clear_landmarks(self.save_queue)
         self.reset_help_images()
         self.reset_landmark_box()
         self.point_counter_label.setText(f"Points: {self.landmark_count} - MAX: {self.max_count}")
         self.signalHandler.clearLandmarks.emit()
         if completed == 1:
-            with open(status_file, 'r') as f:
-                status_dict = json.load(f)
             # Update the status for the current sequence
-            status_dict[self.current_sequence_path] = 0
+            self.status_store.set(self.current_sequence_path, 0)
             self.updateStatusTree(0)
-            # Save the updated status dictionary
-            with open(status_file, 'w') as f:
-                json.dump(status_dict, f, indent=4)
             
      
     # Save landmarks call    
+    @QtCore.pyqtSlot()
+    @timed()
     def save_Landmarks(self):
         # Clean the coordinates box
         msgBox = QMessageBox()
         print(f'-> Save landmarks button pressed with {self.landmark_count} landmarks')
         if self.landmark_count == self.max_count:
-            # status de current_image to 1
-            self.current_image.save_landmarks()
-            # Load the status dictionary
-            with open(status_file, 'r') as f:
-                status_dict = json.load(f)
-            # Update the status for the current sequence
-            status_dict[self.current_sequence_path] = 1
+            # status de current_image to 1, the files are written by the save queue
+            self.current_image.save_landmarks(self.save_queue)
+            # Update the status for the current sequence, reverted by on_save_failed
+            self.status_store.set(self.current_sequence_path, 1)
             self.updateStatusTree(1)
-            # Save the updated status dictionary
-            with open(status_file, 'w') as f:
-                json.dump(status_dict, f, indent=4)
-            msgBox.setWindowTitle("Success!") 
-            msgBox.setText("Landmarks succesfully saved.")
-            msgBox.setIcon(QMessageBox.Information)
-            msgBox.setStyleSheet(message_box_style)
-            msgBox.exec()
         else:
             
             msgBox.setWindowTitle("Incomplete Landmarks")
@@ -569,6 +644,31 @@ class LabelingGUIWindow(QMainWindow):
             msgBox.setStyleSheet(message_box_style)
             msgBox.exec()
     
+    # A queued save or clear reached the disk
+    def on_save_finished(self, sequence_path, status):
+        if status == 1:
+            msgBox = QMessageBox()
+            msgBox.setWindowTitle("Success!") 
+            msgBox.setText(f"Landmarks succesfully saved for {os.path.basename(sequence_path)}.")
+            msgBox.setIcon(QMessageBox.Information)
+            msgBox.setStyleSheet(message_box_style)
+            msgBox.exec()
+
+    # A queued write failed, its sequence goes back to status 0 (write_landmarks already emptied its json)
+    def on_save_failed(self, sequence_path, message):
+        self.status_store.set(sequence_path, 0)
+        self.updateStatusTree(0, sequence_path)
+        if self.current_image is not None and normalize_path(self.current_image.dicom_dir) == normalize_path(sequence_path):
+            self.current_image.status = 0
+        QMessageBox.warning(self, 'Error', f"Failed to save landmarks of {os.path.basename(sequence_path)} due to: {message}")
+
+    # Pending saves are written before the window goes away
+    def closeEvent(self, event):
+        self.save_queue.close()
+        print(f'|-> Render scheduler: {self.render_scheduler.summary()} |')
+        print(f'|-> Volume cache: {volume_cache.summary()} |')
+        super().closeEvent(event)
+
     # Reset the view of the camera 
     def reset_view(self):
         self.interactorStyle.reset_camera()     
@@ -576,44 +676,25 @@ class LabelingGUIWindow(QMainWindow):
     ''' ----------------------  STATUS OF LANDMARK LABELING ----------------------'''   
     # Finds the first unchecked sequence
     def find_first_unchecked_sequence(self):
-        # Load the status dictionary
-        with open(status_file, 'r') as f:
-            status_dict = json.load(f)
         # Find the first sequence with status 0
-
-        for sequence_path, status in status_dict.items():
-            if status == 0:
-                return sequence_path          
-        return ''
+        return self.work_queue.first_pending() or ''
     
     # Get status for a sequence
+    # sequence_path = D:/DataOrtho/DATASET_AXIAL/94/RIGHT/pd_tse_fs_tra_12 exemplo, in memory lookup whatever the separators
     def get_status_for_sequence(self,sequence_path):
-        # sequence_path = D:/DataOrtho/DATASET_AXIAL/94/RIGHT/pd_tse_fs_tra_12\ exemplo
-        with open(status_file, 'r') as f:
-                status_dict = json.load(f)
-        split_index = sequence_path.find('DATASET_') + len('DATASET_')
-        part1 = sequence_path[:split_index]
-        part2 = sequence_path[split_index:]
-        
-        # replace the forward slashes in part2, wow string operation
-        part2 = part2.replace('/', '\\')
-        sequence_path = part1 + part2
-        return status_dict[sequence_path]
+        return self.status_store.get(sequence_path)
     
     # Method that follows the logic explained above, returns the state sequence and the subset (the first 0 sequence) 
     def getCurrentSequence(self):
         src_subsets = [os.path.join(base_dir, d) for d in os.listdir(base_dir) if os.path.isdir(os.path.join(base_dir, d))]
         current = self.find_first_unchecked_sequence() # finds the first 0 status available: axial -> dynamic -> sagittal
         
+        # everything labeled, start on the first sequence
         if not current:
-            with open(status_file,'r') as f:
-                status_dict = json.load(f)
-        
-        if status_dict:
-            current = next(iter(status_dict))
+            current = self.status_store.first_path()
             
-        else:
-            print("No sequences found in status.json. The program will now exit.")
+        if not current:
+            print("No sequences found in the status store. The program will now exit.")
             QMessageBox.critical(self, "Error", "No sequences found. The program will now exit.")
             QApplication.quit()
             sys.exit(1)       
@@ -681,75 +762,52 @@ class LabelingGUIWindow(QMainWindow):
         # Use pathlib to get a list of all directories in the parent directory of the current pathh
         return [str(d) for d in Path(base_dir).iterdir() if d.is_dir()]      
 
-    # Tree View of each dataset, accordingly to the dataset choosen
-    # Gives the status for each sequence
-    def add_folder_to_model(self, folder_path, parent_item, depth=0):
-        folder = QDir(folder_path)
-        folder.setFilter(QDir.Filter.NoDotAndDotDot | QDir.Filter.AllDirs | QDir.Filter.Files)
-        
-        entry_list = folder.entryList()
-        entry_list = [entry for entry in entry_list if QFileInfo(folder.filePath(entry)).isDir()]       
-        if depth == 0:
-            entry_list = sorted(entry_list, key=lambda x: int(x))
-            
-        for entry in entry_list:
-            child_path = folder.filePath(entry)
-            child_info = QFileInfo(child_path)
-            if child_info.isDir():
-                child_item = QStandardItem(child_info.fileName())
-                
-                self.add_folder_to_model(child_path, child_item,depth+1)
-                if depth == 2:
-                    status_item = QStandardItem()
-                    status = self.get_status_for_sequence(child_path)
-                    status_item.setText(str(status))
-                    parent_item.appendRow([child_item, status_item]) 
-                else:
-                    parent_item.appendRow(child_item)
-
     # Updates the tree givin the choice made in the combobox
+    @timed()
     def update_tree_view(self,index):
         selected_dataset = self.choose_picture_comboboxSource.itemText(index)
         selected_dataset = selected_dataset.replace("\\", "/")
-        self.model.clear()
-        self.model.setHorizontalHeaderLabels(['Folder', 'Status', 'Landmarks'])
-        self.add_folder_to_model(selected_dataset, self.model.invisibleRootItem(), 0)
+        self.model.set_root(selected_dataset)
         self.current_subset_path = selected_dataset
    
         
     # Change status after save_Landmarks   
-    def updateStatusTree(self,status):
-        sequence_path_components = self.extract_components(self.current_sequence_path)
-        if sequence_path_components is None:
-            print(f"|Error|-> Failed to extract components from sequence path: {self.current_sequence_path}")
+    @timed()
+    def updateStatusTree(self,status,sequence_path=None):
+        sequence_path = sequence_path or self.current_sequence_path
+        tree_key = self.get_tree_key(sequence_path)
+        if tree_key is None:
             return
-        
-        path_parts_in_tree_order = [sequence_path_components["Individual"], sequence_path_components["Knee"], sequence_path_components["Sequence"]]
-        parent_item = self.model.invisibleRootItem() #ROOT item
-        for part in path_parts_in_tree_order:
-        # finding basically the child of parent_item that has the sequence part
-            for row in range(parent_item.rowCount()):
-                child_item = parent_item.child(row)
-                if child_item.text() == part:
-                    parent_item = child_item
-                    break
-        index = self.model.indexFromItem(parent_item)
-        status_index = index.sibling(index.row(), 1)
-        status_item = self.model.itemFromIndex(status_index)
-        if status_item is not None:
-            print(f"-> Changed {parent_item.text()} status from {status_item.text()} para {status}")
-            status_item.setText(str(status))
+        previous = self.model.set_status(*tree_key, status)
+        if previous is not None:
+            print(f"-> Changed {tree_key[2]} status from {previous} para {status}")
         else:
-            print(f"No status item found for sequence: {self.current_sequence_path}")
+            # not listed yet, it reads its status once its knee is expanded
+            print(f"No status item found for sequence: {sequence_path}")
+
+    # (individual, knee, sequence) key of a sequence in the tree, None when it belongs to another subset
+    def get_tree_key(self, sequence_path):
+        sequence_path_components = self.extract_components(sequence_path)
+        if sequence_path_components is None:
+            print(f"|Error|-> Failed to extract components from sequence path: {sequence_path}")
+            return None
+        if sequence_path_components["Dataset"] != os.path.basename(os.path.normpath(self.model.root_path)):
+            return None
+        return (sequence_path_components["Individual"], sequence_path_components["Knee"], sequence_path_components["Sequence"])
     
     # Load a new Sequence of Images
+    @timed()
     def load_new_DICOMImage(self, item_path,status,dataset_type):
         if self.current_image is not None:
+            self.current_image.close()
             self.current_image.ren.RemoveActor(self.current_image.actor)
+        # a save of this sequence still in the queue must reach its json before the landmarks are read back
+        self.save_queue.flush(item_path)
         self.current_image = DICOMImage(item_path,self.ren)
         # reset the renderer and add the new image
         self.current_image.ren.RemoveAllViewProps()
         self.current_image.ren.AddActor(self.current_image.actor)
+        self.current_image.ren.AddActor(self.current_image.overlay.actor)
         image_center = self.current_image.get_center()
         # update the camera position to be centered on the new image with the corrected axis
         camera = self.ren.GetActiveCamera()
@@ -759,6 +817,8 @@ class LabelingGUIWindow(QMainWindow):
         self.ren.ResetCamera()
         # Redraw the image
         self.vtkWidget.GetRenderWindow().Render()
+        # window/level sliders follow the new image
+        self.configure_sliders()
         # The camera is now updated with the correspondent correct values
         self.interactorStyle.update_parameters(self.current_image.width,self.current_image.height,self.current_image,0,max_landmarks[dataset_type])
         # if new item_path completed lets load landmarks from Json
@@ -782,24 +842,63 @@ class LabelingGUIWindow(QMainWindow):
             parent = parent.parent()
         # Check if the clicked item is at depth == 2
         if depth == 2:
-            # clear no matter what
-            self.coordinates_box.clear()
             # Path of the clicked item
             item_path = self.get_sequence_path(index)
-            self.current_sequence_path = item_path
-            with open(status_file, "r") as f:
-                status_dict = json.load(f)
             # Dataset type 
-            subset = self.get_image_type(self.current_sequence_path)        
-            self.current_subset_path = subset
-            self.load_new_DICOMImage(item_path,status_dict.get(self.current_sequence_path),subset)  
-            # update the image label
-            self.update_image_path_label(item_path)
-            # load new help images            
-            self.load_help_images(subset)
-            self.landmark_count = 0
-            self.slice = self.current_image.index+1
-            self.slice_number.setText(str(self.slice))
+            self.current_subset_path = self.open_sequence(item_path)
+
+    # Shows a sequence, returns its dataset type
+    @timed()
+    def open_sequence(self, sequence_path):
+        # clear no matter what
+        self.coordinates_box.clear()
+        self.current_sequence_path = sequence_path
+        subset = self.get_image_type(self.current_sequence_path)
+        # never waited for on the GUI thread: a finished prefetch is a volume cache hit, an unfinished one is
+        # stopped and the sequence streams like any other
+        self.prefetch_stop.set()
+        self.load_new_DICOMImage(sequence_path,self.status_store.get(self.current_sequence_path),subset)  
+        # update the image label
+        self.update_image_path_label(sequence_path)
+        # load new help images            
+        self.load_help_images(subset)
+        self.landmark_count = 0
+        self.pending_slice = None
+        self.slice = self.current_image.index+1
+        self.slice_number.setText(str(self.slice))
+        self.prefetch_next()
+        return subset
+
+    # Next sequence with status 0 of the current dataset, in status order
+    def next_unlabeled_sequence(self):
+        subset = subset_of(self.current_sequence_path)
+        next_sequence_path = self.work_queue.next_pending(self.current_sequence_path, subset)
+        if next_sequence_path is None:
+            QMessageBox.information(self, 'All Labeled', f"There is no other sequence with status 0 in {subset}.")
+            return
+        self.open_sequence(next_sequence_path)
+
+    # Decodes the next unlabeled sequence into the volume cache while the current one is labeled
+    def prefetch_next(self):
+        self.prefetch_stop.set()
+        self.prefetch_path = self.work_queue.next_pending(self.current_sequence_path, subset_of(self.current_sequence_path))
+        if self.prefetch_path is None:
+            return
+        self.prefetch_stop = threading.Event()
+        self.prefetch_thread = threading.Thread(target=self.prefetch_worker, args=(self.current_image, self.prefetch_path, self.prefetch_stop), daemon=True)
+        self.prefetch_thread.start()
+
+    def prefetch_worker(self, current_image, sequence_path, stop):
+        # the sequence on screen gets the decode pool first, a sequence switch meanwhile stops the wait
+        while current_image.loader is not None and current_image.loader.is_alive() and not stop.is_set():
+            current_image.loader.join(0.1)
+        if stop.is_set():
+            return
+        try:
+            if prefetch_volume(sequence_path, stop):
+                print(f'|-> Prefetched {sequence_path} |')
+        except Exception as e:
+            print(f"Failed to prefetch {sequence_path} due to: {e}")
             
     # Given an index of the click gives the path of Subset
     def get_sequence_path(self,index):
@@ -813,25 +912,11 @@ class LabelingGUIWindow(QMainWindow):
         return item_path  
     # updates the tree by removing the sequence from it
     def remove_sequence_tree_view(self,sequence_path):
-        sequence_path_components = self.extract_components(sequence_path)
-        if sequence_path_components is None:
-            print(f"|Error|-> Failed to extract components from sequence path: {sequence_path}")
-            return
-        
-        path_parts_tree_order  = [sequence_path_components["Individual"], sequence_path_components["Knee"], sequence_path_components["Sequence"]]
-        parent_item = self.model.invisibleRootItem()
-        for part in path_parts_tree_order:
-            for row in range(parent_item.rowCount()):
-                child_item = parent_item.child(row)
-                if child_item.text() == part:
-                    parent_item = child_item
-                    break 
-                
-        # find the parent of the sequence item and remove the sequence item
-        grand_parent = parent_item.parent()
-        if grand_parent is not None:
+        tree_key = self.get_tree_key(sequence_path)
+        if tree_key is not None and self.model.remove_sequence(*tree_key):
             print(f'|-> Sequence removed from tree: New current path choosen {self.current_sequence_path}|')
-            grand_parent.removeRow(parent_item.row())
+        # the knee is listed again on its next expansion
+        self.model.invalidate_listing(os.path.dirname(os.path.normpath(sequence_path)))
                 
     # Deletes completly the current sequence that the viewer is labeling
     def remove_current_sequence(self):
@@ -846,46 +931,30 @@ class LabelingGUIWindow(QMainWindow):
         
         if ret == QMessageBox.Yes:
             try:
-                # Update status.json - Check for status on status.json
-                with open(status_file, 'r') as f:
-                    status_data = json.load(f)
-                sequence_keys = list(status_data.keys())
-                current_index = sequence_keys.index(self.current_sequence_path)
+                # next sequence to label, looked up before the current one leaves the work queue
+                next_sequence_path = self.work_queue.next_pending(self.current_sequence_path)
                 
-                # Delete the sequence from the status.json. Excel only if status 1
-                if self.current_sequence_path in status_data:
-                    if status_data[self.current_sequence_path] == 1:
-                        print('remove excel')
-                    #TODO: excel remover
+                # queued writes of the sequence land before it is cleared and its directory removed
+                self.save_queue.flush(self.current_image.dicom_dir)
+                # Delete the sequence from the status store. Its landmark store row only if status 1
+                if self.current_sequence_path in self.status_store:
+                    if self.status_store.get(self.current_sequence_path) == 1:
                         self.current_image.clear_landmarks()              
-                    # status.json - works
-                    del status_data[self.current_sequence_path]
-                  
-                with open(status_file, 'w') as f:
-                    json.dump(status_data, f,indent=4)
+                    self.status_store.remove(self.current_sequence_path)
                 # removal update on the tree before self.current_sequence_path is updated
                 self.remove_sequence_tree_view(self.current_sequence_path)
-                # remove the directory - works
+                # remove the directory - works, the background loader must stop reading it first and its packed volume be unmapped
+                self.current_image.close()
+                self.current_image.release_volume()
                 shutil.rmtree(self.current_sequence_path) 
                 
-                # Last one, next sequence to be displayed is the immediatly afterwards - 
-                # #TODO:Ciclo for? Procurar e fazer um processo iterativo a encontrar o próximo 0
+                # the next sequence with status 0 is displayed, wrapping around to the first one
                 last_current_sequence_path = self.current_sequence_path
-                if current_index + 1 < len(sequence_keys):
-                    next_sequence_path = sequence_keys[current_index + 1]
-                    self.current_sequence_path = next_sequence_path
-                    self.update_image_path_label(next_sequence_path)
-                    subset = self.get_image_type(self.current_sequence_path)
-                    # Reload the GUI to reflect the removal, or switch to a placeholder image or message
-                    self.load_new_DICOMImage(next_sequence_path,status_data.get(self.current_sequence_path),subset)  
-                    # Eliminate the landmarks on coordinate box
-                    self.reset_landmark_box()
-                    self.load_help_images(subset)
-                    self.landmark_count = 0
-                    self.slice = self.current_image.index+1
-                    self.slice_number.setText(str(self.slice))                    
+                if next_sequence_path is not None:
+                    # Reload the GUI to reflect the removal
+                    self.open_sequence(next_sequence_path)
                 else:         
-                    self.current_sequence_path = sequence_keys[0]   
+                    self.current_sequence_path = self.status_store.first_path() or last_current_sequence_path
                     QMessageBox.information(self, 'Last Sequence', "Failed to upload new sequence due to missing sequence of images with status 0.")
             
                 print(f'|-> Completly eliminated sequence {last_current_sequence_path}')
@@ -898,58 +967,36 @@ class LabelingGUIWindow(QMainWindow):
     def load_help_images(self,subset):
         # To enable the load help images, the dataset and the knee in current path
         # To check which type of help is need, the current path must be checked for the current dataset
-        # clear the help_images before updating
-        self.help_images.clear()
-        if subset == 'DATASET_AXIAL':
-            info = self.extract_components(self.current_sequence_path)
-            help_folder = os.path.join(help_path, subset, info['Knee'])
-            # ascending sort
-            file_paths = sorted(os.listdir(help_folder), key=lambda x: int(x.split('.')[0]))
-            for file_path in file_paths:
-                if file_path.endswith(".png"):
-                    self.help_images.append(os.path.join(help_folder, file_path))
-        else:
-            help_folder = os.path.join(help_path,subset)
-            file_paths = sorted(os.listdir(help_folder), key=lambda x: int(x.split('.')[0]))
-            for file_path in file_paths:
-                if file_path.endswith(".png"):
-                    self.help_images.append(os.path.join(help_folder, file_path))
+        info = self.extract_components(self.current_sequence_path)
+        self.help_key = help_key(subset, info['Knee'] if info else None)
+        self.help_images = self.help_cache.image_paths(self.help_key)
                     
         # Set the first help image in the image holder
         if len(self.help_images) > 0:
-            pixmap = self.load_image(self.help_images[0])
-            self.image_holder.setPixmap(pixmap)
-
-    # Basic display of image given an image_path
-    def load_image(self, image_path):
-        reader = QImageReader(image_path)
-        image = reader.read()
-        pixmap = QPixmap.fromImage(image)
-        max_width = 320
-        max_height = 320
-        pixmap = pixmap.scaled(max_width, max_height, Qt.KeepAspectRatio)
+            self.show_help_image(0)
+
+    # Basic display of a help image, the cache holds it ready
+    def show_help_image(self, index):
+        pixmap = self.help_cache.pixmap(self.help_key, index)
         self.image_holder.setFixedSize(pixmap.width(), pixmap.height())
-        return pixmap
+        self.image_holder.setPixmap(pixmap)
     
     # Displays the next image in help_images
     def next_help_image(self,count):
         if count < self.max_count:
             self.help_image_index = count
-            pixmap = self.load_image(self.help_images[self.help_image_index])
-            self.image_holder.setPixmap(pixmap)
+            self.show_help_image(self.help_image_index)
         
     # Display the previous image in help_images
     def prev_help_image(self,count):
         if self.help_image_index > 0:
             self.help_image_index = count - 1
-            pixmap = self.load_image(self.help_images[self.help_image_index])
-            self.image_holder.setPixmap(pixmap)  
+            self.show_help_image(self.help_image_index)
     
     # On the clear coordinates button call      
     def reset_help_images(self):
         self.help_image_index = 0
-        pixmap = self.load_image(self.help_images[self.help_image_index])
-        self.image_holder.setPixmap(pixmap) 
+        self.show_help_image(self.help_image_index)
         
 if __name__ == "__main__":
     app = QApplication(sys.argv)  
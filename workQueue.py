@@ -0,0 +1,108 @@
+import re
+import bisect
+from statusStore import normalize_path
+
+'''
+    Sequences still to label (status 0), in status.json order, overall and per DATASET_* subset.
+    Each list holds the sorted positions of its pending sequences, so the next/previous unlabeled sequence is a bisect
+    away instead of a scan of every status. The queue listens to the StatusService and follows every status change.
+'''
+
+# DATASET_* component of a sequence path, None when there is none
+def subset_of(sequence_path):
+    for part in re.split(r'[\\/]', sequence_path):
+        if part.startswith('DATASET_'):
+            return part
+    return None
+
+class WorkQueue:
+    def __init__(self, status_service):
+        self.status_service = status_service
+        status_service.add_listener(self.on_status_changed)
+        self.rebuild()
+
+    def rebuild(self):
+        self.positions = {} # normalized path -> position in status.json order
+        self.paths = {} # position -> path as stored
+        self.subsets = {} # normalized path -> DATASET_* subset
+        self.pending = {None: []} # subset (None for all) -> sorted positions of the status 0 sequences
+        self.next_position = 0
+        for path in self.status_service.paths():
+            self.add(path)
+            if self.status_service.get(path) == 0:
+                self.insert(normalize_path(path))
+
+    def add(self, path):
+        key = normalize_path(path)
+        if key not in self.positions:
+            # new sequences go to the end, like new rows of the status store
+            position = self.next_position
+            self.next_position += 1
+            self.positions[key] = position
+            self.paths[position] = path
+            self.subsets[key] = subset_of(path)
+        return key
+
+    def insert(self, key):
+        position = self.positions[key]
+        for pending in (self.pending[None], self.pending.setdefault(self.subsets[key], [])):
+            i = bisect.bisect_left(pending, position)
+            if i == len(pending) or pending[i] != position:
+                pending.insert(i, position)
+
+    def discard(self, key):
+        position = self.positions[key]
+        for pending in (self.pending[None], self.pending.get(self.subsets[key], [])):
+            i = bisect.bisect_left(pending, position)
+            if i < len(pending) and pending[i] == position:
+                del pending[i]
+
+    # StatusService listener
+    def on_status_changed(self, path, status):
+        if path is None:
+            self.rebuild()
+            return
+        key = normalize_path(path)
+        if status is None:
+            if key in self.positions:
+                self.discard(key)
+                del self.paths[self.positions.pop(key)]
+                del self.subsets[key]
+            return
+        key = self.add(path)
+        if status == 0:
+            self.insert(key)
+        else:
+            self.discard(key)
+
+    # First unlabeled sequence after sequence_path (the first one when it is None or unknown), wrapping around.
+    # None when there is no other unlabeled sequence
+    def next_pending(self, sequence_path=None, subset=None):
+        pending = self.pending.get(subset, [])
+        if not pending:
+            return None
+        position = self.positions.get(normalize_path(sequence_path)) if sequence_path is not None else None
+        if position is None:
+            return self.paths[pending[0]]
+        i = bisect.bisect_right(pending, position)
+        candidate = pending[i] if i < len(pending) else pending[0]
+        return self.paths[candidate] if candidate != position else None
+
+    # Last unlabeled sequence before sequence_path, wrapping around
+    def previous_pending(self, sequence_path=None, subset=None):
+        pending = self.pending.get(subset, [])
+        if not pending:
+            return None
+        position = self.positions.get(normalize_path(sequence_path)) if sequence_path is not None else None
+        if position is None:
+            return self.paths[pending[-1]]
+        i = bisect.bisect_left(pending, position)
+        candidate = pending[i - 1] if i > 0 else pending[-1]
+        return self.paths[candidate] if candidate != position else None
+
+    def first_pending(self, subset=None):
+        pending = self.pending.get(subset, [])
+        return self.paths[pending[0]] if pending else None
+
+    def count(self, subset=None):
+        return len(self.pending.get(subset, []))